@@ -1,19 +1,24 @@
 from dotenv import load_dotenv
 import os
-from src.submit_questions import submit_answers
-import pandas as pd
+from src.submit_questions import SubmissionManager
 import gradio as gr
 from src.question_choices import get_question_choices
 from src.question_fetcher import fetch_questions
-from src.agent import ManagerAgent, call_agent
-from src.constants import agent_code, is_dry_run
+from src.question_store import question_store
+from src.agent import ManagerAgent, call_agent, call_agent_stream
+from src.results_store import RunResultsStore
+from src.sessions import session_manager
+from src.constants import agent_code, is_dry_run, max_queued_runs
 
 load_dotenv()
 
-def run_and_submit_all(profile: gr.OAuthProfile | None):
+question_store.start_background_refresh()
+
+def run_and_submit_all(profile: gr.OAuthProfile | None, request: gr.Request):
     """
-    Fetches all questions, runs the ManagerAgent on them, submits all answers,
-    and displays the results.
+    Fetches all questions, runs the session's ManagerAgent on them, submits all answers,
+    and displays the results. Each question waits for a global run slot, so other users'
+    single questions are served in between.
     """
     # --- Determine HF Space Runtime URL and Repo URL ---
     if profile:
@@ -21,54 +26,72 @@ def run_and_submit_all(profile: gr.OAuthProfile | None):
         print(f"User logged in: {username}")
     else:
         print("User not logged in.")
-        return "Please Login to Hugging Face with the button.", None
+        yield "Please Login to Hugging Face with the button.", None
+        return
 
     # 1. Instantiate Agent ( modify this part to create your agent)
+    session = session_manager.get(request.session_hash)
     try:
-        agent = ManagerAgent()
+        agent = session.get_agent(ManagerAgent)
     except Exception as e:
         print(f"Error instantiating agent: {e}")
-        return f"Error initializing agent: {e}", None
+        yield f"Error initializing agent: {e}", None
+        return
     
     print(agent_code)
 
     # 2. Fetch Questions
     err, questions_data = fetch_questions()
     if err:
-        return err, None
-    # 3. Run your Agent
-    results_log = []
-    answers_payload = []
-    print(f"Running agent on {len(questions_data)} questions...")
-    for item in questions_data:
-        result_log, answer_payload = call_agent(agent, item)
-        if result_log is not None and answer_payload is not None:
-            results_log.append(result_log)
-            answers_payload.append(answer_payload)
-
-    if not answers_payload:
+        yield err, None
+        return
+    # 3. Run your Agent, answers are submitted in batches as they come
+    submission_manager = SubmissionManager(username, agent_code)
+    results_store = RunResultsStore()
+    answers_count = 0
+    print(f"Running agent on {len(questions_data)} questions (run {results_store.run_id})...")
+    for index, item in enumerate(questions_data):
+        for status in session_manager.queue(session):
+            yield f"Question {index + 1}/{len(questions_data)}: {status}", results_store.view()
+        # The slot is held from here: a client leaving at any later yield must still free it
+        try:
+            yield f"Running question {index + 1}/{len(questions_data)}...", results_store.view()
+            result = call_agent(agent, item, results_store.run_id)
+        finally:
+            session_manager.release(session)
+        if result is None:
+            continue
+        # Failed questions are stored too, to compare error rates between runs
+        results_store.add(result)
+        if result.answer_payload() is not None:
+            submission_manager.add(result.answer_payload())
+            answers_count += 1
+
+    if not answers_count:
         print("Agent did not produce any answers to submit.")
-        return "Agent did not produce any answers to submit.", pd.DataFrame(results_log)
+        yield "Agent did not produce any answers to submit.", results_store.view()
+        return
 
-    # 4. Prepare Submission 
-    submission_data = {"username": username.strip(), "agent_code": agent_code, "answers": answers_payload}
-    status_update = f"Agent finished. Submitting {len(answers_payload)} answers for user '{username}'..."
+    status_update = f"Agent finished. Submitting {answers_count} answers for user '{username}'..."
     print(status_update)
+    yield status_update, results_store.view()
 
-    # 5. Submit
-    return submit_answers(submission_data, results_log)
+    # 4. Submit the remaining answers merged with the best previous ones
+    yield submission_manager.submit(results_store.results)
 
-def run_one_and_submit(profile: gr.OAuthProfile | None, selected_q: str):
+def run_one_and_submit(profile: gr.OAuthProfile | None, selected_task_id: str, request: gr.Request):
     """
-    Fetches questions, runs the ManagerAgent on a specific question, submits the answer,
-    and displays the result.
+    Runs the session's ManagerAgent on a specific question, submits the answer,
+    and displays the result. The queue position, then the agent progress, are streamed
+    to the status box.
     
     Args:
         profile: The user's OAuth profile
-        selected_q: The question string to run
+        selected_task_id: The task_id of the question to run
+        request: The Gradio request, identifying the browser session
     
-    Returns:
-        Tuple of (status message, results dataframe)
+    Yields:
+        Tuples of (status message, results dataframe)
     """
     # --- Determine HF Space Runtime URL and Repo URL ---
     if profile:
@@ -76,47 +99,61 @@ def run_one_and_submit(profile: gr.OAuthProfile | None, selected_q: str):
         print(f"User logged in: {username}")
     else:
         print("User not logged in.")
-        return "Please Login to Hugging Face with the button.", None
+        yield "Please Login to Hugging Face with the button.", None
+        return
 
     # 1. Instantiate Agent
+    session = session_manager.get(request.session_hash)
     try:
-        agent = ManagerAgent()
+        agent = session.get_agent(ManagerAgent)
     except Exception as e:
         print(f"Error instantiating agent: {e}")
-        return f"Error initializing agent: {e}", None
+        yield f"Error initializing agent: {e}", None
+        return
     
     print(agent_code)
 
-    # 2. Fetch Questions
-    err, questions_data = fetch_questions()
-    if err:
-        return err, None
-
-    _, question_index_map = get_question_choices()
-    question_index = question_index_map.get(selected_q, 0)
-    
-    # Check if question_index is valid
-    if question_index < 0 or question_index >= len(questions_data):
-        return f"Invalid question index: {question_index}. Must be between 0 and {len(questions_data)-1}.", None
+    # 2. Look up the question
+    if not question_store.wait_until_loaded():
+        yield "Questions are still loading, please try again in a moment.", None
+        return
+    item = question_store.get(selected_task_id) or question_store.find_by_text(selected_task_id)
+    if item is None:
+        yield "Please select a question from the list.", None
+        return
     
     # 3. Run Agent on specific question
-    results_log = []
-    answers_payload = []
+    results_store = RunResultsStore()
     
-    item = questions_data[question_index]
-    result_log, answer_payload = call_agent(agent, item)
-    if result_log is None or answer_payload is None:
-        return "Invalid question item with missing task_id or question.", None
-    results_log.append(result_log)
-    answers_payload.append(answer_payload)
-
-    # 4. Prepare Submission 
-    submission_data = {"username": username.strip(), "agent_code": agent_code, "answers": answers_payload}
-    status_update = f"Agent finished. Submitting answer for question {question_index} for user '{username}'..."
+    result = None
+    for status in session_manager.queue(session):
+        yield status, None
+    try:
+        for kind, payload in call_agent_stream(agent, item, results_store.run_id):
+            if kind == "progress":
+                yield f"Running...\n{payload}", None
+            else:
+                result = payload
+    finally:
+        session_manager.release(session)
+    if result is None:
+        yield "Invalid question item with missing task_id or question.", None
+        return
+    # Failed questions are stored too, to compare error rates between runs
+    results_store.add(result)
+    if result.answer_payload() is None:
+        yield f"Agent failed on task {result.task_id}, nothing submitted: {result.error}", results_store.view()
+        return
+
+    # 4. Merge with the best previous answers so earlier ones are not overwritten
+    submission_manager = SubmissionManager(username, agent_code)
+    submission_manager.add(result.answer_payload())
+    status_update = f"Agent finished. Submitting answer for task {item['task_id']} for user '{username}'..."
     print(status_update)
+    yield status_update, None
 
     # 5. Submit
-    return submit_answers(submission_data, results_log)
+    yield submission_manager.submit(results_store.results)
 
 
 # --- Build Gradio Interface using Blocks ---
@@ -139,14 +176,13 @@ with gr.Blocks() as demo:
 
     gr.LoginButton()
 
-    question_choices, question_index_map = get_question_choices()
-
     # --- Run a Single Question ---
     gr.Markdown("# Run one question")
     
 
+    # Choices are filled on page load, so building the UI never waits for the questions API
     question_dropdown = gr.Dropdown(
-        choices=question_choices,
+        choices=get_question_choices(),
         label="Select a Question",
         interactive=True
     )
@@ -175,6 +211,15 @@ with gr.Blocks() as demo:
         outputs=[status_output, results_table]
     )
 
+    def load_question_choices():
+        question_store.wait_until_loaded()
+        return gr.update(choices=get_question_choices())
+
+    demo.load(fn=load_question_choices, outputs=[question_dropdown])
+
+# Runs are limited by the session manager's run slots, Gradio only bounds the waiting handlers
+demo.queue(default_concurrency_limit=max_queued_runs)
+
 if __name__ == "__main__":
     print("\n" + "-"*30 + " App Starting " + "-"*30)
     # Check for SPACE_HOST and SPACE_ID at startup for information
@@ -204,4 +249,4 @@ if __name__ == "__main__":
     print("-"*(60 + len(" App Starting ")) + "\n")
 
     print("Launching Gradio Interface for Basic Agent Evaluation...")
-    demo.launch(debug=True, share=False)
\ No newline at end of file
+    demo.launch(debug=True, share=False, max_threads=max_queued_runs + 8)
\ No newline at end of file
@@ -1,14 +1,23 @@
 
+import contextvars
 import os
+import queue
+import threading
 import time
 import traceback
-import re
 from smolagents import CodeAgent
-from src.models import general_model
-from src.tools.web_rag import web_rag_agent
-from src.constants import files_url
-from src.agent_understand_file import understand_file_agent
-from src.tools.chess import chess_agent
+from smolagents.memory import ActionStep, FinalAnswerStep
+from smolagents.utils import AgentError
+from src.models import manager_model, final_answer_listener, usage_meter, FinalAnswerDetected, UsageMeter
+from src.tools.web_rag import create_web_rag_agent
+from src.constants import files_url, agent_streaming, default_scratch_dir
+from src.agent_understand_file import create_understand_file_agent
+from src.tools.chess import create_chess_agent
+from src.tools.general import base_tools
+from src.scoring import extract_final_answer, find_final_answer, normalize_answer
+from src.memory_guard import memory_guard, iter_agents
+from src.prompts import add_instructions, describe_prompt, PROMPTS_VERSION
+from src.results_store import RunResult
 
 # Original GAIA system prompt
 
@@ -54,47 +63,29 @@ systemPrompt = (
 #     #     return f"QUESTION:\n{question}\nFILE_PATH: {file_path}\nFILE_TYPE: {file_type}"
 #     return f"QUESTION:\n{question}"
 
-def extract_final_answer(response: str) -> str:
-    # Define patterns to look for final answer with case insensitivity
-    patterns = [
-        r"FINAL ANSWER:\s*\[?([^\]\n]+)\]?",
-        r"FINAL ANSWER:\s*([^\n]+)",
-        r"ANSWER:\s*\[?([^\]\n]+)\]?"
-    ]
-    
-    # Try each pattern until we find a match
-    match = None
-    for pattern in patterns:
-        match = re.search(pattern, response, re.IGNORECASE)
-        if match:
-            break
-    if match:
-        return match.group(1)
-    # Ensure final answer is returned as a string
-    if response is None:
-        return ""
-    return response
-
 class ManagerAgent:
-    def __init__(self):
+    def __init__(self, scratch_dir: str = default_scratch_dir):
+        # Sub-agents are built for this manager: their memory is never shared with another run
         self.agent = CodeAgent(
-            model=general_model,
-            tools=[],
-            managed_agents=[understand_file_agent, web_rag_agent, chess_agent],
-            add_base_tools=True,
+            model=manager_model,
+            tools=base_tools(),
+            managed_agents=[create_understand_file_agent(scratch_dir), create_web_rag_agent(), create_chess_agent()],
+            add_base_tools=False,
             max_steps=10,
             name="ManagerAgent",
             planning_interval=3
         )
-        self.agent.memory.system_prompt.system_prompt += f"\n{systemPrompt}"
+        add_instructions(self.agent, systemPrompt)
         self.agent.visualize()
+        for current in iter_agents(self.agent):
+            print(describe_prompt(current))
 
         print("ManagerAgent initialized.")
 
     def call(self, question: str) -> str:
         return self.call_with_file(question, None, None)
     
-    def call_with_file(self, question: str, file_path: str, file_type: str) -> str:
+    def _prepare_run(self, question: str, file_path: str, file_type: str):
         print(f"ManagerAgent received question (first 50 chars): {question[:50]}...")
         
         prompt= f"QUESTION:\n{question}"
@@ -104,18 +95,136 @@ class ManagerAgent:
                 "file_url": file_path,
                 "file_type": file_type
             }
+        return prompt, additional_args
+
+    def call_with_file(self, question: str, file_path: str, file_type: str) -> str:
+        if agent_streaming:
+            final_answer = None
+            for update in self.stream_with_file(question, file_path, file_type):
+                final_answer = update["final_answer"]
+            return final_answer
+        prompt, additional_args = self._prepare_run(question, file_path, file_type)
         output = self.agent.run(prompt, additional_args=additional_args)
         print(f"ManagerAgent output: {output}")
-        return extract_final_answer(str(output))
+        return normalize_answer(extract_final_answer(str(output)))
+
+    def stream_with_file(self, question: str, file_path: str = None, file_type: str = None, meter: UsageMeter = None):
+        """
+        Runs the agent in a background thread and yields progress updates as dicts with
+        'status' and 'final_answer' keys; only the last update carries the final answer.
+        The run is cancelled as soon as a final answer appears in the streamed manager
+        model output or in a step observation, instead of waiting for the remaining steps.
+        Model calls of the run are counted by `meter` when given.
+        """
+        prompt, additional_args = self._prepare_run(question, file_path, file_type)
+        events = queue.Queue()
+        cancelled = threading.Event()
+
+        def on_partial_output(content):
+            events.put(("tokens", content, None))
+            return find_final_answer(content)
+
+        def run_agent():
+            final_answer_listener.set(on_partial_output)
+            if meter is not None:
+                usage_meter.set(meter)
+            try:
+                for step in self.agent.run(prompt, stream=True, additional_args=additional_args):
+                    # Wait for the consumer to look at the step, so an interrupt lands before the next one
+                    resume = threading.Event()
+                    events.put(("step", step, resume))
+                    resume.wait()
+            except Exception as e:
+                detected = e if isinstance(e, FinalAnswerDetected) else e.__cause__
+                if isinstance(detected, FinalAnswerDetected):
+                    events.put(("final", detected.answer, None))
+                elif not (cancelled.is_set() and isinstance(e, AgentError)):
+                    events.put(("error", e, None))
+            finally:
+                events.put(("done", None, None))
+
+        # The worker sees the caller's context variables, e.g. the usage meter of the question
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(run_agent,), name="manager-agent-run", daemon=True)
+        worker.start()
+        final_answer = None
+        step_number = 0
+        last_update = 0.0
+        try:
+            while True:
+                kind, payload, resume = events.get()
+                if kind == "tokens":
+                    if time.time() - last_update > 0.5:
+                        last_update = time.time()
+                        yield {"status": f"Step {step_number + 1}...\n{payload[-300:]}", "final_answer": None}
+                elif kind == "step":
+                    if isinstance(payload, FinalAnswerStep):
+                        if final_answer is None:
+                            final_answer = extract_final_answer(str(payload.final_answer))
+                        resume.set()
+                        continue
+                    if isinstance(payload, ActionStep):
+                        step_number += 1
+                        found = find_final_answer(str(payload.observations or ""), partial=False)
+                        if found is not None and final_answer is None:
+                            print("Final answer found in the step observations, cancelling the remaining steps.")
+                            final_answer = found
+                            cancelled.set()
+                            self.agent.interrupt()
+                    resume.set()
+                    yield {"status": f"Step {step_number} done.", "final_answer": None}
+                elif kind == "final":
+                    print("Final answer found while streaming, cancelling the rest of the generation.")
+                    final_answer = payload
+                elif kind == "error":
+                    raise payload
+                else:
+                    break
+        finally:
+            if worker.is_alive():
+                cancelled.set()
+                self.agent.interrupt()
+                while worker.is_alive():
+                    try:
+                        _, _, resume = events.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                    if resume is not None:
+                        resume.set()
+        print(f"ManagerAgent output: {final_answer}")
+        yield {"status": "Final answer found.", "final_answer": normalize_answer(final_answer)}
 
-def call_agent(agent, item):
+def run_metered(meter: UsageMeter, function, *args):
+    """Calls `function` with the model calls it makes counted by `meter`."""
+    context = contextvars.copy_context()
+    context.run(usage_meter.set, meter)
+    return context.run(function, *args)
+
+def call_agent(agent, item, run_id: str = ""):
     """
     Runs the agent on a single question item.
     Args:
         agent: An instantiated agent callable.
         item: dict with at least 'task_id' and 'question' keys.
+        run_id: Run the result belongs to.
     Returns:
-        Tuple (result_log_dict, answer_payload_dict) or (None, None) if invalid.
+        RunResult, or None if the item is invalid.
+    """
+    result = None
+    for kind, payload in call_agent_stream(agent, item, run_id):
+        if kind == "result":
+            result = payload
+    return result
+
+def call_agent_stream(agent, item, run_id: str = ""):
+    """
+    Runs the agent on a single question item, streaming its progress.
+    Args:
+        agent: An instantiated agent callable.
+        item: dict with at least 'task_id' and 'question' keys.
+        run_id: Run the result belongs to.
+    Yields:
+        ("progress", status_str) tuples while the agent runs, then one
+        ("result", RunResult) tuple, with None if the item is invalid.
     """
     start_time = time.time()
     
@@ -124,29 +233,43 @@ def call_agent(agent, item):
     file_name = item.get("file_name")
     if not task_id or question_text is None:
         print(f"Invalid question item: {item}")
-        return None, None
-    try:
-        if file_name:
-            name, file_type = os.path.splitext(file_name)
-            file_path = f"{files_url}/{name}"
-            submitted_answer = agent.call_with_file(question_text, file_path, file_type) 
-        else:
-            submitted_answer = agent.call(question_text)
-        answer_payload = {"task_id": task_id, "submitted_answer": submitted_answer}
-        result_log = {"Task ID": task_id, "Question": question_text, "Submitted Answer": submitted_answer}
-        # Duration calculation
-        end_time = time.time()
-        duration = end_time - start_time
-        if duration < 60:
-            duration_str = f"{duration:.2f} seconds"
-        else:
-            mins = int(duration // 60)
-            secs = duration % 60
-            duration_str = f"{mins}m {secs:.2f}s"
-        result_log["Duration"] = duration_str
-        return result_log, answer_payload
-    except Exception as e:
-        print(f"Error running agent on task {task_id}: {e}")
-        traceback.print_exc()
-        result_log = {"Task ID": task_id, "Question": question_text, "Submitted Answer": f"AGENT ERROR: {e}"}
-        return result_log, None
\ No newline at end of file
+        yield "result", None
+        return
+    inner_agent = getattr(agent, "agent", agent)
+    meter = UsageMeter()
+    # The agents keep every step, image and variable of a run until they are released
+    with memory_guard.track(f"task {task_id}", inner_agent):
+        try:
+            file_path, file_type = None, None
+            if file_name:
+                name, file_type = os.path.splitext(file_name)
+                file_path = f"{files_url}/{name}"
+            if agent_streaming and hasattr(agent, "stream_with_file"):
+                submitted_answer = None
+                for update in agent.stream_with_file(question_text, file_path, file_type, meter=meter):
+                    submitted_answer = update["final_answer"]
+                    yield "progress", update["status"]
+            elif file_path:
+                submitted_answer = run_metered(meter, agent.call_with_file, question_text, file_path, file_type)
+            else:
+                submitted_answer = run_metered(meter, agent.call, question_text)
+            error = None
+        except Exception as e:
+            print(f"Error running agent on task {task_id}: {e}")
+            traceback.print_exc()
+            submitted_answer, error = f"AGENT ERROR: {e}", str(e)
+        result = RunResult(
+            run_id=run_id,
+            task_id=task_id,
+            question=question_text,
+            submitted_answer="" if submitted_answer is None else str(submitted_answer),
+            duration_seconds=time.time() - start_time,
+            input_tokens=meter.input_tokens,
+            cached_input_tokens=meter.cached_input_tokens,
+            output_tokens=meter.output_tokens,
+            model_calls=meter.calls,
+            steps=sum(isinstance(step, ActionStep) for step in getattr(getattr(inner_agent, "memory", None), "steps", [])),
+            error=error,
+            prompt_version=PROMPTS_VERSION,
+        )
+        yield "result", result
@@ -1,34 +1,40 @@
 from smolagents import CodeAgent, FinalAnswerTool, PythonInterpreterTool
+from src.constants import default_scratch_dir
 from src.models import general_model
+from src.prompts import add_instructions
 from src.tools.audio_url_to_text import AudioUrlToTextTool
 from src.tools.vision import VisionTool
+from src.tools.python_sandbox import PythonSandboxTool
 
 system_prompt = (
     f"You are a specialized agent in understanding files."
     f"You use the extension of the file to choose between suitable tools to interpret a provided file."
     f"You must help answering the user's question by returning the content of the file that is relevant to the question."
     f"You should only return the information gathered from the file and relevent to the question"
+    f"To know what a python file outputs, run it with your PythonSandboxTool instead of interpreting it step by step."
     # f"If the answer cannot be found or inferred from the file, respond with: 'EXCEPTION: The file does not allow answering the question.'"
     # f"Before answering, you must control that the answer is coherent with the question."
     # f"If the answer is not coherent with the question, respond with: 'EXCEPTION: The answer is not coherent with the question.'"
 )
 
-understand_file_agent = CodeAgent(
-    model=general_model,
-    tools=[FinalAnswerTool(), PythonInterpreterTool(), AudioUrlToTextTool(), VisionTool()],
-    add_base_tools=False,
-    max_steps=10,
-    name="UnderstandFileAgent",
-    description=(
-        f"This agent is responsible for understanding external files and returning the content of the file that is relevant to the question."
-        f"This agent supports speech recognition, python file interpretation, and excel file processing."
-        f"Always return a string as a return value."
-    ),
-    additional_authorized_imports=[
-        'requests', 'pandas', 'openpyxl', 'io', 'os', 'urllib', 'pathlib'
-    ]
-)
-understand_file_agent.memory.system_prompt.system_prompt += f"\n{system_prompt}"
+def create_understand_file_agent(scratch_dir: str = default_scratch_dir):
+    """Builds a file agent whose tools download attachments to `scratch_dir`."""
+    understand_file_agent = CodeAgent(
+        model=general_model,
+        tools=[FinalAnswerTool(), PythonInterpreterTool(), PythonSandboxTool(scratch_dir), AudioUrlToTextTool(scratch_dir), VisionTool(scratch_dir)],
+        add_base_tools=False,
+        max_steps=10,
+        name="UnderstandFileAgent",
+        description=(
+            f"This agent is responsible for understanding external files and returning the content of the file that is relevant to the question."
+            f"This agent supports speech recognition, sandboxed python file execution, and excel file processing."
+            f"Always return a string as a return value."
+        ),
+        additional_authorized_imports=[
+            'requests', 'pandas', 'openpyxl', 'io', 'os', 'urllib', 'pathlib'
+        ]
+    )
+    return add_instructions(understand_file_agent, system_prompt)
 
 # def format_prompt_for_file_agent(file_path: str, file_extension: str, question: str) -> str:
 #     return f"FILE_PATH: {file_path}\nFILE_EXTENSION: {file_extension}\nQuestion: {question}"
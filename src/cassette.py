@@ -0,0 +1,190 @@
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+import requests
+from src.constants import cassette_mode, cassette_path
+
+# Modes:
+# - off: every call goes to the network
+# - record: every call goes to the network and its response is stored
+# - replay: responses come from the cassette only, a missing one is an error
+# - cache: responses come from the cassette when present, others are recorded
+CASSETTE_MODES = ("off", "record", "replay", "cache")
+
+class CassetteMiss(RuntimeError):
+    """Raised in replay mode for a request that was never recorded."""
+
+
+def _json_default(value):
+    # PIL images and other binary payloads are keyed by content, never by repr (which holds memory addresses)
+    if hasattr(value, "tobytes"):
+        return {"__bytes_sha256__": hashlib.sha256(value.tobytes()).hexdigest()}
+    if isinstance(value, (bytes, bytearray)):
+        return {"__bytes_sha256__": hashlib.sha256(value).hexdigest()}
+    if hasattr(value, "dict"):
+        return value.dict()
+    return str(value)
+
+def request_key(kind: str, request) -> str:
+    canonical = json.dumps(request, sort_keys=True, default=_json_default, ensure_ascii=False)
+    return hashlib.sha256(f"{kind}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    Record/replay store for external calls, kept in one SQLite file.
+    Each interaction is indexed by (kind, request hash, occurrence) and its response is stored
+    as zlib-compressed JSON. The occurrence counter makes repeated identical requests replay
+    their responses in the order they were recorded.
+    """
+
+    def __init__(self, path: str = cassette_path, mode: str = cassette_mode):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}', expected one of {CASSETTE_MODES}.")
+        self.path = path
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._occurrences = {}
+        self._db = None
+        self.counters = {"hits": 0, "misses": 0, "recorded": 0}
+
+    @property
+    def active(self) -> bool:
+        return self.mode != "off"
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS interactions ("
+                "kind TEXT NOT NULL, key TEXT NOT NULL, occurrence INTEGER NOT NULL, "
+                "response BLOB NOT NULL, recorded_at REAL NOT NULL, "
+                "PRIMARY KEY (kind, key, occurrence))"
+            )
+            self._db.commit()
+        return self._db
+
+    def _next_occurrence(self, kind: str, key: str) -> int:
+        occurrence = self._occurrences.get((kind, key), 0)
+        self._occurrences[(kind, key)] = occurrence + 1
+        return occurrence
+
+    def _lookup(self, kind: str, key: str, occurrence: int):
+        row = self._connection().execute(
+            "SELECT response FROM interactions WHERE kind = ? AND key = ? AND occurrence = ?",
+            (kind, key, occurrence),
+        ).fetchone()
+        return None if row is None else json.loads(zlib.decompress(row[0]))
+
+    def _store(self, kind: str, key: str, occurrence: int, response):
+        blob = zlib.compress(json.dumps(response, default=_json_default).encode("utf-8"), 6)
+        db = self._connection()
+        db.execute(
+            "INSERT OR REPLACE INTO interactions (kind, key, occurrence, response, recorded_at) VALUES (?, ?, ?, ?, ?)",
+            (kind, key, occurrence, blob, time.time()),
+        )
+        db.commit()
+
+    def through(self, kind: str, request, perform):
+        """
+        Runs `perform()` (which must return JSON-serializable data) through the cassette.
+        Args:
+            kind: Family of the call, e.g. 'chat', 'http', 'search'.
+            request: JSON-serializable description of the request, hashed into the key.
+            perform: Callable doing the real call.
+        Returns:
+            The recorded or fresh response.
+        """
+        if not self.active:
+            return perform()
+        key = request_key(kind, request)
+        with self._lock:
+            occurrence = self._next_occurrence(kind, key)
+            recorded = self._lookup(kind, key, occurrence) if self.mode in ("replay", "cache") else None
+            self.counters["hits" if recorded is not None else "misses"] += 1
+        if recorded is not None:
+            return recorded
+        if self.mode == "replay":
+            raise CassetteMiss(f"No recorded {kind} response for request {key[:12]} (occurrence {occurrence}) in {self.path}.")
+        response = perform()
+        with self._lock:
+            self._store(kind, key, occurrence, response)
+            self.counters["recorded"] += 1
+        return response
+
+    def stats(self) -> dict:
+        """Hit/miss counters of this process and the number of stored interactions per kind."""
+        stats = {"mode": self.mode, "path": self.path, **self.counters}
+        if self.active:
+            with self._lock:
+                rows = self._connection().execute("SELECT kind, COUNT(*) FROM interactions GROUP BY kind").fetchall()
+            stats["stored"] = dict(rows)
+        return stats
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+cassette = Cassette()
+
+
+def _encode_response(response: requests.Response) -> dict:
+    return {
+        "status_code": response.status_code,
+        "reason": response.reason,
+        "url": response.url,
+        "headers": dict(response.headers),
+        "encoding": response.encoding,
+        "content": base64.b64encode(response.content).decode("ascii"),
+    }
+
+def _decode_response(data: dict, request: requests.PreparedRequest | None = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = data["status_code"]
+    response.reason = data["reason"]
+    response.url = data["url"]
+    response.headers = requests.structures.CaseInsensitiveDict(data["headers"])
+    response.encoding = data["encoding"]
+    response._content = base64.b64decode(data["content"])
+    response.request = request
+    return response
+
+_original_session_request = requests.Session.request
+
+def _session_request(session, method, url, params=None, data=None, headers=None, json=None, **kwargs):
+    # Only what identifies the request goes into the key: no timeouts, auth or user agent
+    request = {
+        "method": method.upper(),
+        "url": url,
+        "params": params,
+        "data": data if isinstance(data, (str, dict, list, type(None))) else hashlib.sha256(bytes(data)).hexdigest(),
+        "json": json,
+        "conditional": {name: value for name, value in (headers or {}).items() if name.lower().startswith("if-")},
+    }
+
+    def perform():
+        response = _original_session_request(session, method, url, params=params, data=data, headers=headers, json=json, **kwargs)
+        return _encode_response(response)
+
+    try:
+        return _decode_response(cassette.through("http", request, perform))
+    except CassetteMiss as e:
+        raise requests.exceptions.ConnectionError(str(e)) from e
+
+def install_requests_hook():
+    """Routes every `requests` call of the process through the cassette."""
+    requests.Session.request = _session_request
+
+
+if cassette.active:
+    print(f"Cassette {cassette.mode} mode, using {cassette.path}")
+    install_requests_hook()
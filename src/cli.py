@@ -0,0 +1,198 @@
+import argparse
+import cProfile
+import os
+import pstats
+import queue
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+CACHE_MODES = ("off", "record", "replay", "cache")
+
+
+def configure_environment(args):
+    """Sets the environment read by src.constants, before any other src module is imported."""
+    if args.cache_mode:
+        os.environ["CASSETTE_MODE"] = args.cache_mode
+    if args.cassette:
+        os.environ["CASSETTE_PATH"] = args.cassette
+    if args.model:
+        os.environ["MODEL_ID"] = args.model
+    if args.manager_model:
+        os.environ["MANAGER_MODEL_ID"] = args.manager_model
+    if args.api_base:
+        os.environ["MODEL_API_BASE"] = args.api_base
+    if args.results_dir:
+        os.environ["RESULTS_DIR"] = args.results_dir
+    if args.dry_run:
+        os.environ["DRY_RUNNN"] = "true"
+
+@contextmanager
+def profiled(path: str | None):
+    """
+    Profiles the block with cProfile, threads started inside it included (the agent runs and
+    their sub-agents run in worker threads), and writes the merged stats to `path`.
+    Read them with `python -m pstats <path>` or snakeviz.
+    """
+    if not path:
+        yield
+        return
+    profiles, lock = [cProfile.Profile()], threading.Lock()
+
+    def start_thread_profile(frame, event, arg):
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        with lock:
+            profiles.append(profile)
+        profile.enable()
+
+    threading.setprofile(start_thread_profile)
+    profiles[0].enable()
+    try:
+        yield
+    finally:
+        profiles[0].disable()
+        threading.setprofile(None)
+        with lock:
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        stats.dump_stats(path)
+        print(f"Profile of {len(profiles)} threads written to {path}")
+
+def select_questions(questions_data: list, task_ids: list) -> list:
+    if not task_ids:
+        return questions_data
+    by_id = {item.get("task_id"): item for item in questions_data}
+    unknown = [task_id for task_id in task_ids if task_id not in by_id]
+    if unknown:
+        print(f"Unknown task ids, skipped: {', '.join(unknown)}")
+    return [by_id[task_id] for task_id in dict.fromkeys(task_ids) if task_id in by_id]
+
+def run_questions(questions: list, concurrency: int, run_id: str):
+    """
+    Runs the questions on `concurrency` ManagerAgents in parallel, each with its own session
+    scratch directory, and yields the RunResult of every question as it finishes.
+    """
+    from src.agent import ManagerAgent, call_agent
+    from src.constants import sessions_dir
+    from src.sessions import Session
+
+    sessions = queue.Queue()
+    for index in range(concurrency):
+        sessions.put(Session(f"cli-{run_id}-{index}", sessions_dir))
+
+    def run(item):
+        session = sessions.get()
+        try:
+            return call_agent(session.get_agent(ManagerAgent), item, run_id)
+        finally:
+            sessions.put(session)
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="cli-run") as executor:
+            futures = [executor.submit(run, item) for item in questions]
+            for future in as_completed(futures):
+                yield future.result()
+    finally:
+        while not sessions.empty():
+            shutil.rmtree(sessions.get().scratch_dir, ignore_errors=True)
+
+def format_summary(results_store, elapsed: float, concurrency: int) -> str:
+    """Timing, token, score and rate limit summary of a finished run."""
+    from src.cassette import cassette
+    from src.models import rate_limit_scheduler
+    from src.results_store import compare_runs, format_duration, results_table
+
+    results = results_store.results
+    lines = [f"Run {results_store.run_id}: {len(results)} questions in {format_duration(elapsed)} with concurrency {concurrency}"]
+    if not results:
+        return "\n".join(lines)
+    summary = compare_runs(results_table(results).to_pandas()).iloc[0]
+    lines.append(f"  Throughput: {60 * len(results) / elapsed:.2f} questions/min, {int(summary['errors'])} errors")
+    lines.append(
+        f"  Per question: median {summary['median_seconds']:.2f}s, p95 {summary['p95_seconds']:.2f}s, "
+        f"max {max(result.duration_seconds for result in results):.2f}s, mean {summary['mean_steps']:.1f} steps"
+    )
+    cache_hit = "n/a" if summary["input_tokens"] == 0 else f"{summary['cache_hit']:.0f}%"
+    lines.append(
+        f"  Tokens: {int(summary['input_tokens'])} input ({int(summary['cached_input_tokens'])} cached, {cache_hit}), "
+        f"{int(summary['output_tokens'])} output, {sum(result.model_calls for result in results)} model calls"
+    )
+    if summary["scored"]:
+        lines.append(f"  Score: {int(summary['correct'])}/{int(summary['scored'])} ({summary['score']:.1f}%) against the local answer key")
+    for model, metrics in rate_limit_scheduler.metrics().items():
+        lines.append(
+            f"  Rate limits {model}: {metrics['requests']} requests, mean wait {metrics['mean_wait']:.2f}s, "
+            f"max queue {metrics['max_queue_depth']}, {metrics['rate_limited']} rate limited"
+        )
+    if cassette.active:
+        lines.append(f"  Cassette ({cassette.mode}): {cassette.counters}")
+    lines.append(f"  Results: {results_store.path}")
+    return "\n".join(lines)
+
+def run_cli(args) -> int:
+    from src.constants import agent_code
+    from src.question_fetcher import fetch_questions
+    from src.results_store import RunResultsStore
+    from src.submit_questions import SubmissionManager
+
+    err, questions_data = fetch_questions()
+    if err:
+        print(err)
+        return 1
+    questions = select_questions(questions_data, args.task_ids)
+    if not questions:
+        print("No questions to run.")
+        return 1
+
+    results_store = RunResultsStore()
+    submission_manager = SubmissionManager(args.username, agent_code) if args.username else None
+    print(f"Running {len(questions)} questions with concurrency {args.concurrency} (run {results_store.run_id})...")
+    start = time.time()
+    with profiled(args.profile):
+        for result in run_questions(questions, args.concurrency, results_store.run_id):
+            if result is None:
+                continue
+            results_store.add(result)
+            outcome = f"error: {result.error}" if result.error is not None else f"answer: {result.submitted_answer}"
+            print(f"[{len(results_store.results)}/{len(questions)}] {result.task_id} in {result.duration_seconds:.2f}s, {outcome}")
+            if submission_manager is not None:
+                submission_manager.add(result.answer_payload())
+    elapsed = time.time() - start
+
+    exit_code = 0 if all(result.error is None for result in results_store.results) else 1
+    if submission_manager is not None:
+        status, _ = submission_manager.submit(results_store.results)
+        if not status.startswith(("Submission Successful", "Mock Submission Successful")):
+            exit_code = 1
+    print(format_summary(results_store, elapsed, args.concurrency))
+    return exit_code
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the agent on all or selected questions without the Gradio app, and print a timing and token summary.")
+    parser.add_argument("task_ids", nargs="*", help="Only run these task ids (all questions by default)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Questions run in parallel, each on its own agent")
+    parser.add_argument("--cache-mode", choices=CACHE_MODES, help="Record/replay mode of external calls (CASSETTE_MODE)")
+    parser.add_argument("--cassette", help="Cassette file (CASSETTE_PATH)")
+    parser.add_argument("--model", help="litellm model id of the agents (MODEL_ID)")
+    parser.add_argument("--manager-model", help="litellm model id of the manager agent, --model by default (MANAGER_MODEL_ID)")
+    parser.add_argument("--api-base", help="API base url of the models (MODEL_API_BASE)")
+    parser.add_argument("--username", help="Submit the answers for this user once the run is done")
+    parser.add_argument("--dry-run", action="store_true", help="Score the submission locally instead of posting it (DRY_RUNNN)")
+    parser.add_argument("--results-dir", help="Directory of the run results (RESULTS_DIR)")
+    parser.add_argument("--profile", metavar="PATH", help="Write cProfile stats of the run, all threads included, to PATH")
+    args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    configure_environment(args)
+    sys.exit(run_cli(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -8,12 +8,83 @@ dotenv.load_dotenv()
 
 DEFAULT_API_URL = "https://agents-course-unit4-scoring.hf.space"
 
-questions_url = f"{DEFAULT_API_URL}/questions"
-submit_url = f"{DEFAULT_API_URL}/submit"
-files_url = f"{DEFAULT_API_URL}/files"
+# Set SCORING_API_URL to point the app to another scoring server, e.g. the local mock (`just mock-server`)
+api_url = os.getenv("SCORING_API_URL", DEFAULT_API_URL).rstrip("/")
+
+questions_url = f"{api_url}/questions"
+submit_url = f"{api_url}/submit"
+files_url = f"{api_url}/files"
 space_id = os.getenv("SPACE_ID")
 
 # In the case of an app running as a hugging Face space, this link points toward your codebase (usefull for others so please keep it public)
 agent_code = f"https://huggingface.co/spaces/{space_id}/tree/main"
 
-is_dry_run = os.environ.get("DRY_RUNNN", "").lower() == "true"
\ No newline at end of file
+is_dry_run = os.environ.get("DRY_RUNNN", "").lower() == "true"
+
+# --- Python sandbox ---
+sandbox_pool_size = int(os.getenv("SANDBOX_POOL_SIZE", "2"))
+sandbox_cpu_seconds = float(os.getenv("SANDBOX_CPU_SECONDS", "10"))
+sandbox_memory_mb = int(os.getenv("SANDBOX_MEMORY_MB", "512"))
+sandbox_timeout = float(os.getenv("SANDBOX_TIMEOUT", "30"))
+# Without user/network namespaces or libseccomp the sandbox can't cut network and process creation:
+# workers then refuse to start, unless this is set to false
+sandbox_require_isolation = os.getenv("SANDBOX_REQUIRE_ISOLATION", "true").lower() == "true"
+# Paths hidden in the sandbox, directories behind an empty read-only mount and files behind /dev/null: .env, data
+# (answer key, cassettes, results, attachments of other sessions) and /proc, with the app's environment.
+# Not the whole repository: the project .venv, and the packages snippets import, live in it
+sandbox_hidden_paths = [path for path in os.getenv("SANDBOX_HIDDEN_PATHS", os.pathsep.join([os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), name) for name in (".env", "data")] + ["/proc"])).split(os.pathsep) if path]
+
+# --- Local scoring ---
+answer_key_path = os.getenv("ANSWER_KEY_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "answer_key.json"))
+
+# --- Submissions ---
+submissions_dir = os.getenv("SUBMISSIONS_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "submissions"))
+submit_batch_size = int(os.getenv("SUBMIT_BATCH_SIZE", "5"))
+submit_max_retries = int(os.getenv("SUBMIT_MAX_RETRIES", "3"))
+
+# --- Question store ---
+questions_refresh_seconds = float(os.getenv("QUESTIONS_REFRESH_SECONDS", "600"))
+
+# --- Models ---
+# litellm model ids of the sub-agents and of the manager agent (the sub-agents' model by default)
+general_model_id = os.getenv("MODEL_ID", "openai/gpt-4.1-mini")
+manager_model_id = os.getenv("MANAGER_MODEL_ID", general_model_id)
+model_api_base = os.getenv("MODEL_API_BASE", "https://api.openai.com/v1")
+
+# --- Model rate limits (per model, shared by the whole process) ---
+rate_limit_rpm = float(os.getenv("OPENAI_RPM", "500"))
+rate_limit_tpm = float(os.getenv("OPENAI_TPM", "200000"))
+rate_limit_max_retries = int(os.getenv("OPENAI_RATE_LIMIT_RETRIES", "3"))
+
+# --- Agent runs ---
+# Stream the manager agent output and stop as soon as the final answer appears
+agent_streaming = os.getenv("AGENT_STREAMING", "true").lower() == "true"
+
+# --- Record/replay of external calls ---
+# off, record, replay or cache (replay what was recorded, record the rest)
+cassette_mode = os.getenv("CASSETTE_MODE", "off").lower()
+cassette_path = os.getenv("CASSETTE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "cassettes", "default.sqlite"))
+
+# --- Local image analysis before the vision model ---
+image_fast_path = os.getenv("IMAGE_FAST_PATH", "true").lower() == "true"
+chess_templates_dir = os.getenv("CHESS_TEMPLATES_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "chess_templates"))
+ocr_min_words = int(os.getenv("OCR_MIN_WORDS", "20"))
+ocr_min_confidence = float(os.getenv("OCR_MIN_CONFIDENCE", "80"))
+chess_search_depth = int(os.getenv("CHESS_SEARCH_DEPTH", "3"))
+
+# --- Memory instrumentation ---
+# tracemalloc slows every allocation down, it is only started when profiling is requested
+memory_profiling = os.getenv("MEMORY_PROFILING", "false").lower() == "true"
+memory_release = os.getenv("MEMORY_RELEASE", "true").lower() == "true"
+memory_history_size = int(os.getenv("MEMORY_HISTORY_SIZE", "1000"))
+
+# --- Run results ---
+results_dir = os.getenv("RESULTS_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "results"))
+
+# --- Multi-tenant app ---
+# Attachments are downloaded here by the file tools, each app session gets its own directory under sessions_dir
+default_scratch_dir = "./data"
+sessions_dir = os.getenv("SESSIONS_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "sessions"))
+session_ttl_seconds = int(os.getenv("SESSION_TTL_SECONDS", "3600"))
+max_concurrent_runs = int(os.getenv("MAX_CONCURRENT_RUNS", "4"))
+max_queued_runs = int(os.getenv("MAX_QUEUED_RUNS", "64"))
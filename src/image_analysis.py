@@ -0,0 +1,281 @@
+import glob
+import os
+import re
+import chess
+import numpy as np
+from PIL import Image
+from src.constants import chess_templates_dir, ocr_min_words, ocr_min_confidence
+
+try:
+    import pytesseract
+except ImportError:  # OCR is optional, images then always go to the vision model
+    pytesseract = None
+
+# Pieces are compared on CELL_SIZE x CELL_SIZE cells cropped by CELL_MARGIN on each side,
+# which keeps the rank/file labels drawn in the square corners out of the comparison
+CELL_SIZE = 32
+CELL_MARGIN = 0.12
+# A pixel is foreground when its color is this far (0-255 scale) from the square color
+FOREGROUND_DISTANCE = 40
+# Pixels closer than this to the square color are the bare square, the piece is drawn over the rest
+SQUARE_COLOR_TOLERANCE = 12
+EMPTY_MAX_FOREGROUND = 0.04
+# Mean squared error (0-1 scale) above which a square does not match any template
+TEMPLATE_MAX_ERROR = 0.03
+# Per-channel distance between the light and dark square colors of a board diagram
+SQUARE_COLORS_MIN_DISTANCE = 25
+BLACK_TO_MOVE_RE = re.compile(r"\bblack(?:'s)?\s+(?:to\s+(?:move|play)|turn|moves)\b|\bturn\s+(?:of|for)\s+black\b", re.IGNORECASE)
+WHITE_TO_MOVE_RE = re.compile(r"\bwhite(?:'s)?\s+(?:to\s+(?:move|play)|turn|moves)\b|\bturn\s+(?:of|for)\s+white\b", re.IGNORECASE)
+SHADES = ("light", "dark")
+TEMPLATE_NAME_RE = re.compile(r"^([wb])([KQRBNP])_(light|dark)$")
+
+
+def _template_name(symbol: str, shade: str) -> str:
+    # 'wK'/'bK' rather than 'K'/'k' so templates survive case-insensitive file systems
+    return ("w" if symbol.isupper() else "b") + symbol.upper() + "_" + shade
+
+def _trim_border(pixels: np.ndarray) -> np.ndarray:
+    """Removes the uniform frame around a board diagram (rows/columns of a single color)."""
+    def uniform(lines):
+        return (lines.std(axis=(1, 2)) < 8) & (np.abs(lines.mean(axis=(1, 2)) - lines.mean()) > 20)
+    rows, cols = ~uniform(pixels), ~uniform(pixels.transpose(1, 0, 2))
+    if not rows.any() or not cols.any():
+        return pixels
+    top, bottom = np.argmax(rows), len(rows) - np.argmax(rows[::-1])
+    left, right = np.argmax(cols), len(cols) - np.argmax(cols[::-1])
+    return pixels[top:bottom, left:right]
+
+def _board_cells(image: Image.Image):
+    """
+    Splits a board diagram into its 64 cells, as displayed (row 0 is the top of the image).
+    Returns (cells, backgrounds, shades) or None when the image is not an 8x8 board:
+    the background color of every square must match the light/dark color of its parity.
+    """
+    pixels = _trim_border(np.asarray(image.convert("RGB"), dtype=np.float32))
+    height, width = pixels.shape[:2]
+    if min(height, width) < 64 or abs(height - width) > 0.05 * max(height, width):
+        return None
+    row_edges = np.linspace(0, height, 9).astype(int)
+    col_edges = np.linspace(0, width, 9).astype(int)
+    cells, backgrounds = [], []
+    for row in range(8):
+        for col in range(8):
+            cell = pixels[row_edges[row]:row_edges[row + 1], col_edges[col]:col_edges[col + 1]]
+            # The square color is what its edges mostly show, pieces sit in the middle
+            edges = np.concatenate([cell[:3].reshape(-1, 3), cell[-3:].reshape(-1, 3), cell[:, :3].reshape(-1, 3), cell[:, -3:].reshape(-1, 3)])
+            backgrounds.append(np.median(edges, axis=0))
+            cells.append(cell)
+    backgrounds = np.array(backgrounds)
+    parity = np.array([(row + col) % 2 for row in range(8) for col in range(8)])
+    light, dark = np.median(backgrounds[parity == 0], axis=0), np.median(backgrounds[parity == 1], axis=0)
+    if np.abs(light - dark).max() < SQUARE_COLORS_MIN_DISTANCE:
+        return None
+    expected = np.where(parity[:, None] == 0, light, dark)
+    if np.abs(backgrounds - expected).max(axis=1).mean() > SQUARE_COLORS_MIN_DISTANCE / 2:
+        return None
+    return cells, expected, [SHADES[p] for p in parity]
+
+def _cell_features(cell: np.ndarray, background: np.ndarray):
+    """
+    Normalized piece image of a square: grayscale foreground on a neutral background,
+    independent of the board colors. Returns (features, foreground_ratio).
+    """
+    height, width = cell.shape[:2]
+    dy, dx = int(height * CELL_MARGIN), int(width * CELL_MARGIN)
+    cell = cell[dy:height - dy, dx:width - dx]
+    foreground = np.abs(cell - background).max(axis=2) > FOREGROUND_DISTANCE
+    gray = np.where(foreground, cell.mean(axis=2) / 255, 0.5)
+    features = np.asarray(Image.fromarray((gray * 255).astype(np.uint8)).resize((CELL_SIZE, CELL_SIZE), Image.BILINEAR), dtype=np.float32) / 255
+    return features, foreground.mean()
+
+def load_piece_templates(templates_dir: str = chess_templates_dir) -> dict:
+    """
+    Piece templates saved by `save_piece_templates`, as {square shade: {piece symbol: features}}.
+    A piece looks different on light and dark squares (a white piece blends into light squares),
+    so each shade has its own templates.
+    """
+    templates = {shade: {} for shade in SHADES}
+    for path in sorted(glob.glob(os.path.join(templates_dir, "*.png"))):
+        match = TEMPLATE_NAME_RE.match(os.path.splitext(os.path.basename(path))[0])
+        if match:
+            color, piece, shade = match.groups()
+            symbol = piece if color == "w" else piece.lower()
+            templates[shade][symbol] = np.asarray(Image.open(path).convert("L"), dtype=np.float32) / 255
+    return templates
+
+def _on_background(cell: np.ndarray, background: np.ndarray, new_background: np.ndarray) -> np.ndarray:
+    """The piece of a cell drawn on another square color."""
+    piece = np.abs(cell - background).max(axis=2) > SQUARE_COLOR_TOLERANCE
+    return np.where(piece[..., None], cell, new_background)
+
+def _recoloring(pairs: list) -> np.ndarray:
+    """
+    Gray level lookup table turning the pieces of one side into the other side's, learned from
+    (cell, background, other side's cell, other background) of the same piece type.
+    """
+    sources, targets = [], []
+    for cell, background, other_cell, other_background in pairs:
+        height, width = min(cell.shape[0], other_cell.shape[0]), min(cell.shape[1], other_cell.shape[1])
+        cell, other_cell = cell[:height, :width], other_cell[:height, :width]
+        # Only pixels inside both outlines tell how a shade of one side is drawn on the other
+        both = (np.abs(cell - background).max(axis=2) > SQUARE_COLOR_TOLERANCE) & (np.abs(other_cell - other_background).max(axis=2) > SQUARE_COLOR_TOLERANCE)
+        sources.append(cell.mean(axis=2)[both])
+        targets.append(other_cell.mean(axis=2)[both])
+    sources, targets = np.concatenate(sources), np.concatenate(targets)
+    bins = (sources // 8).astype(int)
+    levels = [(sources[bins == b].mean(), np.median(targets[bins == b])) for b in np.unique(bins)]
+    return np.interp(np.arange(256), *zip(*levels))
+
+def _recolored(cell: np.ndarray, background: np.ndarray, lookup: np.ndarray) -> np.ndarray:
+    """The piece of a cell drawn in the other side's colors."""
+    piece = np.abs(cell - background).max(axis=2) > SQUARE_COLOR_TOLERANCE
+    gray = lookup[np.clip(cell.mean(axis=2), 0, 255).astype(int)]
+    return np.where(piece[..., None], gray[..., None], background)
+
+def save_piece_templates(image: Image.Image, fen: str, flipped: bool = False, templates_dir: str = chess_templates_dir) -> list:
+    """
+    Builds piece templates from a diagram of a known position, for a new piece set.
+    A diagram rarely shows every piece on both square shades: a missing shade is drawn from the same
+    piece on the other shade, and a piece only one side has (e.g. black knights only) is recolored
+    from it with the gray levels of the piece types both sides have. Every piece type must appear.
+    Args:
+        image: Board diagram.
+        fen: Position shown by the diagram.
+        flipped: Whether the diagram shows the board from black's side.
+    Returns:
+        list: (symbol, shade) of the templates written, the drawn ones included.
+    """
+    board_cells = _board_cells(image)
+    if board_cells is None:
+        raise ValueError("The image is not recognized as a board diagram.")
+    board = chess.Board(fen)
+    cells, square_colors = {}, {}
+    for index, (cell, background, shade) in enumerate(zip(*board_cells)):
+        square_colors[shade] = background
+        piece = board.piece_at(_square_of(index, flipped))
+        if piece is not None:
+            cells.setdefault((piece.symbol(), shade), (cell, background))
+    symbols = {symbol for symbol, _ in cells}
+    missing = {symbol.upper() for symbol in "KQRBNP" if symbol not in symbols and symbol.lower() not in symbols}
+    if missing:
+        raise ValueError(f"The diagram shows no {', '.join(sorted(missing))}: templates cannot be drawn for them.")
+    pairs = [
+        (cells[(symbol.lower(), black_shade)], cells[(symbol, white_shade)])
+        for symbol in "KQRBNP" for black_shade in SHADES for white_shade in SHADES
+        if (symbol.lower(), black_shade) in cells and (symbol, white_shade) in cells
+    ]
+    recoloring = {
+        "white": _recoloring([(*black, *white) for black, white in pairs]),
+        "black": _recoloring([(*white, *black) for black, white in pairs]),
+    }
+
+    for (symbol, shade), (cell, background) in list(cells.items()):
+        other_shade = SHADES[1 - SHADES.index(shade)]
+        if (symbol, other_shade) not in cells:
+            cells[(symbol, other_shade)] = (_on_background(cell, background, square_colors[other_shade]), square_colors[other_shade])
+    for symbol in symbols - {symbol.swapcase() for symbol in symbols}:
+        lookup = recoloring["black" if symbol.isupper() else "white"]
+        for shade in SHADES:
+            cell, background = cells[(symbol, shade)]
+            cells[(symbol.swapcase(), shade)] = (_recolored(cell, background, lookup), background)
+
+    os.makedirs(templates_dir, exist_ok=True)
+    for (symbol, shade), (cell, background) in cells.items():
+        features, _ = _cell_features(cell, background)
+        Image.fromarray((features * 255).astype(np.uint8)).save(os.path.join(templates_dir, f"{_template_name(symbol, shade)}.png"))
+    return list(cells)
+
+def _square_of(index: int, flipped: bool) -> int:
+    row, col = divmod(index, 8)
+    if flipped:
+        return chess.square(7 - col, row)
+    return chess.square(col, 7 - row)
+
+def _side_to_move(question: str, flipped: bool) -> bool:
+    if BLACK_TO_MOVE_RE.search(question or ""):
+        return chess.BLACK
+    if WHITE_TO_MOVE_RE.search(question or ""):
+        return chess.WHITE
+    # Diagrams are usually drawn from the side to move
+    return chess.BLACK if flipped else chess.WHITE
+
+def board_to_fen(image: Image.Image, question: str = "", templates: dict | None = None):
+    """
+    Recognizes a chess diagram with the piece templates, without any model call.
+    The orientation is inferred from the kings and pawns, the side to move from the question.
+    Returns the FEN, or None when the image is not a board or a square matches no template.
+
+    >>> sample = Image.open(os.path.join(os.path.dirname(chess_templates_dir), "cca530fc-4052-43b2-b130-b30968d8aa44.png"))
+    >>> board_to_fen(sample)
+    '3r2k1/pp3pp1/4b2p/7Q/3n4/PqBBR2P/5PP1/6K1 b - - 0 1'
+
+    Other positions, drawn from the sample's squares with the pieces kept upright:
+    >>> def rearranged(source_of):
+    ...     cells, backgrounds, _ = _board_cells(sample)
+    ...     size = min(min(cell.shape[:2]) for cell in cells)
+    ...     squares = [_on_background(cells[source_of(index)][:size, :size], backgrounds[source_of(index)], backgrounds[index]) for index in range(64)]
+    ...     return Image.fromarray(np.concatenate([np.concatenate(squares[row * 8:row * 8 + 8], axis=1) for row in range(8)]).astype(np.uint8))
+    >>> board_to_fen(rearranged(lambda index: 63 - index), "Black to move.")  # seen from white's side
+    '3r2k1/pp3pp1/4b2p/7Q/3n4/PqBBR2P/5PP1/6K1 b - - 0 1'
+    >>> board_to_fen(rearranged(lambda index: index ^ 7))  # mirrored files: every piece on the other square shade
+    '1k2r3/1pp3pp/p2b4/Q7/4n3/P2RBBqP/1PP5/1K6 b - - 0 1'
+    """
+    templates = load_piece_templates() if templates is None else templates
+    board_cells = _board_cells(image)
+    if not any(templates.values()) or board_cells is None:
+        return None
+    placement = []
+    for cell, background, shade in zip(*board_cells):
+        features, foreground_ratio = _cell_features(cell, background)
+        if foreground_ratio < EMPTY_MAX_FOREGROUND:
+            placement.append(None)
+            continue
+        if not templates[shade]:
+            return None
+        symbols = list(templates[shade])
+        errors = ((np.stack(list(templates[shade].values())) - features) ** 2).mean(axis=(1, 2))
+        if errors.min() > TEMPLATE_MAX_ERROR:
+            return None
+        placement.append(symbols[int(errors.argmin())])
+
+    rows_of = lambda symbol: [index // 8 for index, s in enumerate(placement) if s == symbol]
+    if len(rows_of("K")) != 1 or len(rows_of("k")) != 1:
+        return None
+    # White plays up the board unless the diagram is flipped
+    white_rows = rows_of("K") + rows_of("P")
+    black_rows = rows_of("k") + rows_of("p")
+    flipped = np.mean(white_rows) < np.mean(black_rows)
+
+    board = chess.Board.empty()
+    for index, symbol in enumerate(placement):
+        if symbol is not None:
+            board.set_piece_at(_square_of(index, flipped), chess.Piece.from_symbol(symbol))
+    board.turn = _side_to_move(question, flipped)
+    board.castling_rights = board.clean_castling_rights()
+    if not board.is_valid():
+        board.castling_rights = chess.BB_EMPTY
+        if not board.is_valid():
+            return None
+    return board.fen()
+
+def ocr_text(image: Image.Image):
+    """
+    Text of a text-heavy image (screenshot, document, table) read with Tesseract.
+    Returns None when OCR is unavailable, or when the image has too few confidently read words
+    to answer from, e.g. a photo.
+    """
+    if pytesseract is None:
+        return None
+    try:
+        data = pytesseract.image_to_data(image.convert("L"), output_type=pytesseract.Output.DICT)
+    except pytesseract.TesseractNotFoundError:
+        print("Tesseract is not installed, skipping OCR.")
+        return None
+    words = [(word, float(conf)) for word, conf in zip(data["text"], data["conf"]) if word.strip() and float(conf) >= 0]
+    if len(words) < ocr_min_words or np.mean([conf for _, conf in words]) < ocr_min_confidence:
+        return None
+    lines = {}
+    for word, conf, block, par, line in zip(data["text"], data["conf"], data["block_num"], data["par_num"], data["line_num"]):
+        if word.strip() and float(conf) >= 0:
+            lines.setdefault((block, par, line), []).append(word)
+    return "\n".join(" ".join(words) for words in lines.values())
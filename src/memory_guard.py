@@ -0,0 +1,171 @@
+import gc
+import os
+import resource
+import threading
+import tracemalloc
+import numpy as np
+from contextlib import contextmanager
+from smolagents.memory import ActionStep, PlanningStep, TaskStep
+from src.constants import memory_profiling, memory_release, memory_history_size
+
+# Approximate size of a decoded RGB pixel, used to account for images kept in agent memory
+BYTES_PER_PIXEL = 3
+TOP_ALLOCATIONS = 5
+WARMUP_FRACTION = 0.1
+
+
+def rss_mb() -> float:
+    """Current resident set size of the process in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def iter_agents(agent):
+    """
+    The agent and every agent reachable from it: managed agents, and agents wrapped
+    by tools (like `VisionTool.agent`). Each agent is yielded once.
+    """
+    seen, pending = set(), [agent]
+    while pending:
+        current = pending.pop()
+        if id(current) in seen or not hasattr(current, "memory"):
+            continue
+        seen.add(id(current))
+        yield current
+        pending.extend(getattr(current, "managed_agents", {}).values())
+        pending.extend(getattr(tool, "agent", None) for tool in getattr(current, "tools", {}).values())
+
+def _step_images(step) -> list:
+    if isinstance(step, TaskStep):
+        return list(step.task_images or [])
+    if isinstance(step, ActionStep):
+        return list(step.observations_images or [])
+    return []
+
+def _step_text_size(step) -> int:
+    size = 0
+    if isinstance(step, ActionStep):
+        size += len(step.model_output or "") + len(step.observations or "")
+    elif isinstance(step, PlanningStep):
+        size += len(step.plan or "")
+    elif isinstance(step, TaskStep):
+        size += len(step.task or "")
+    for message in getattr(step, "model_input_messages", None) or []:
+        for part in message.get("content") or []:
+            size += len(part.get("text") or "") if isinstance(part, dict) else len(str(part))
+    return size
+
+def agent_memory_stats(agent) -> dict:
+    """{agent name: {'steps', 'images', 'approx_bytes'}} for the agent and its sub-agents."""
+    stats = {}
+    for current in iter_agents(agent):
+        steps = current.memory.steps
+        # The task images are also the observation images of the first step
+        images = list({id(image): image for step in steps for image in _step_images(step)}.values())
+        image_bytes = sum(image.width * image.height * BYTES_PER_PIXEL for image in images)
+        stats[getattr(current, "name", None) or type(current).__name__] = {
+            "steps": len(steps),
+            "images": len(images),
+            "approx_bytes": image_bytes + sum(_step_text_size(step) for step in steps),
+        }
+    return stats
+
+def release_agent_memory(agent):
+    """
+    Drops what the agent and its sub-agents keep from their last run: memory steps (closing
+    their images), monitor counters, and the variables of the agent and of its python executor.
+    """
+    for current in iter_agents(agent):
+        for step in current.memory.steps:
+            for image in _step_images(step):
+                image.close()
+        current.memory.reset()
+        current.monitor.reset()
+        current.state.clear()
+        executor = getattr(current, "python_executor", None)
+        if executor is not None and isinstance(getattr(executor, "state", None), dict):
+            executor.state.clear()
+
+
+class MemoryGuard:
+    """
+    Per-question memory instrumentation for long-running processes.
+    Each tracked question records RSS, the memory kept by the agents and, with profiling on,
+    tracemalloc current/peak sizes and the top allocation sites that grew during the question.
+    With release on, the agents' memory is dropped once the question is done.
+    """
+
+    def __init__(self, profiling: bool = memory_profiling, release: bool = memory_release, history_size: int = memory_history_size):
+        self.profiling = profiling
+        self.release = release
+        self.history_size = history_size
+        self.history = []
+        self._lock = threading.Lock()
+        if self.profiling and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def track(self, label: str, agent):
+        """
+        Measures the question run inside the block and releases `agent` afterwards.
+        Process-wide figures (RSS, tracemalloc) include any question running concurrently.
+        """
+        snapshot = tracemalloc.take_snapshot() if self.profiling else None
+        if self.profiling:
+            tracemalloc.reset_peak()
+        rss_before = rss_mb()
+        try:
+            yield
+        finally:
+            self._record(label, agent, rss_before, snapshot)
+
+    def _record(self, label: str, agent, rss_before: float, snapshot):
+        record = {"label": label, "agents": agent_memory_stats(agent)}
+        if self.release:
+            release_agent_memory(agent)
+            gc.collect(1)
+        record["rss_before_mb"] = rss_before
+        record["rss_after_mb"] = rss_mb()
+        if snapshot is not None:
+            current, peak = tracemalloc.get_traced_memory()
+            record["traced_mb"] = current / 1024 ** 2
+            record["traced_peak_mb"] = peak / 1024 ** 2
+            growth = tracemalloc.take_snapshot().compare_to(snapshot, "lineno")
+            record["top_growth"] = [str(stat) for stat in growth[:TOP_ALLOCATIONS]]
+        with self._lock:
+            self.history = (self.history + [record])[-self.history_size:]
+        print(format_memory_record(record))
+
+    def summary(self) -> dict:
+        """
+        RSS at the first and last tracked question, and its growth per question: the slope of RSS
+        over the questions, leaving out the first WARMUP_FRACTION of them (imports, caches, first allocations).
+        """
+        with self._lock:
+            history = list(self.history)
+        if not history:
+            return {"questions": 0}
+        steady = [record["rss_after_mb"] for record in history[int(len(history) * WARMUP_FRACTION):]]
+        growth = float(np.polyfit(np.arange(len(steady)), steady, 1)[0]) if len(steady) > 1 else 0.0
+        return {
+            "questions": len(history),
+            "rss_start_mb": history[0]["rss_before_mb"],
+            "rss_end_mb": history[-1]["rss_after_mb"],
+            "rss_growth_per_question_mb": growth,
+        }
+
+
+def format_memory_record(record: dict) -> str:
+    kept = ", ".join(f"{name}: {stats['steps']} steps/{stats['images']} images/{stats['approx_bytes'] / 1024:.0f} KB" for name, stats in record["agents"].items())
+    line = f"Memory after {record['label']}: RSS {record['rss_before_mb']:.1f} -> {record['rss_after_mb']:.1f} MB"
+    if "traced_mb" in record:
+        line += f", traced {record['traced_mb']:.1f} MB (peak {record['traced_peak_mb']:.1f} MB)"
+    line += f"\n  Kept by agents: {kept}"
+    for stat in record.get("top_growth", []):
+        line += f"\n  {stat}"
+    return line
+
+
+memory_guard = MemoryGuard()
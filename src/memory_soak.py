@@ -0,0 +1,108 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from smolagents.models import ChatMessage, MessageRole, Model
+
+SOAK_IMAGE_TASK_ID = "maxresdefault"
+# Size of the text each sub-agent returns, close to what a file description weighs in real runs
+OBSERVATION_CHARS = 20000
+
+class ScriptedModel(Model):
+    """
+    Offline model replaying a fixed script of code actions, so the soak exercises the real agents,
+    tools and memory without any API call: one reply for the first step, another for the next ones.
+    """
+
+    def __init__(self, first_reply: str, next_reply: str):
+        super().__init__(model_id="scripted")
+        self.first_reply = first_reply
+        self.next_reply = next_reply
+
+    def __call__(self, messages, stop_sequences=None, grammar=None, tools_to_call_from=None, **kwargs) -> ChatMessage:
+        self.last_input_token_count = sum(len(str(message.get("content"))) for message in messages) // 4
+        if stop_sequences and "<end_plan>" in stop_sequences:
+            content = "1. Look at the attached file.\n2. Answer.\n<end_plan>"
+        else:
+            # Observations of earlier steps are replayed to the model as tool responses
+            first_step = not any(message.get("role") == MessageRole.TOOL_RESPONSE for message in messages)
+            content = self.first_reply if first_step else self.next_reply
+        self.last_output_token_count = len(content) // 4
+        return ChatMessage(role="assistant", content=content)
+
+def _code(code: str) -> str:
+    return f"Thought: next step.\nCode:\n```py\n{code}\n```<end_code>"
+
+def scripted_models(image_url: str) -> dict:
+    """Scripts per agent name: the manager calls the file agent, which calls VisionTool, which runs the vision agent."""
+    return {
+        "ManagerAgent": ScriptedModel(
+            _code('description = UnderstandFileAgent(task="Describe the attached image.")\nprint(description[:200])'),
+            _code('final_answer("42")'),
+        ),
+        "UnderstandFileAgent": ScriptedModel(
+            _code(f'print(VisionTool(prompt="Describe the image.", image_url="{image_url}", file_extension=".jpg"))'),
+            _code(f'final_answer("file description " * {OBSERVATION_CHARS // 17})'),
+        ),
+        "VisionAgent": ScriptedModel(
+            _code(f'final_answer("image content " * {OBSERVATION_CHARS // 14})'),
+            _code('final_answer("image content")'),
+        ),
+    }
+
+def run_memory_soak(questions: int, release: bool, profiling: bool, report_every: int) -> dict:
+    """
+    Runs `questions` scripted questions through the real ManagerAgent and its sub-agents,
+    images included, and reports RSS every `report_every` questions.
+    Returns the memory guard summary.
+    """
+    from src.mock_server import start_mock_server
+    server = start_mock_server()
+    os.environ["SCORING_API_URL"] = f"http://127.0.0.1:{server.server_address[1]}"
+    # Imported once the API URL is set, and with streaming off as scripted models do not stream
+    os.environ["AGENT_STREAMING"] = "false"
+    from src import agent as agent_module
+    from src.memory_guard import MemoryGuard, iter_agents
+
+    agent_module.memory_guard = MemoryGuard(profiling=profiling, release=release, history_size=questions)
+    # Files the agents download go to a throwaway scratch dir, not the repo's data dir
+    scratch_dir = tempfile.mkdtemp(prefix="memory-soak-")
+    manager = agent_module.ManagerAgent(scratch_dir)
+    models = scripted_models(f"{os.environ['SCORING_API_URL']}/files/{SOAK_IMAGE_TASK_ID}")
+    for current in iter_agents(manager.agent):
+        if current.name in models:
+            current.model = models[current.name]
+
+    start = time.time()
+    try:
+        for index in range(questions):
+            agent_module.call_agent(manager, {"task_id": f"soak-{index}", "question": "What is in the attached image?", "file_name": ""})
+            if (index + 1) % report_every == 0:
+                summary = agent_module.memory_guard.summary()
+                print(f"[memory soak] {index + 1}/{questions} questions, RSS {summary['rss_end_mb']:.1f} MB, {time.time() - start:.1f}s")
+    finally:
+        server.shutdown()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    return agent_module.memory_guard.summary()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run hundreds of scripted questions through the real agents and report memory growth.")
+    parser.add_argument("--questions", type=int, default=300)
+    parser.add_argument("--no-release", action="store_true", help="Keep the agents' memory between questions, to compare")
+    parser.add_argument("--profile", action="store_true", help="Record tracemalloc snapshots per question (slower)")
+    parser.add_argument("--report-every", type=int, default=50)
+    parser.add_argument("--max-growth-mb", type=float, default=0.05, help="Exit with an error above this RSS growth per question")
+    args = parser.parse_args()
+
+    summary = run_memory_soak(args.questions, not args.no_release, args.profile, args.report_every)
+    print(
+        f"Memory soak: {summary['questions']} questions, RSS {summary['rss_start_mb']:.1f} -> {summary['rss_end_mb']:.1f} MB, "
+        f"{summary['rss_growth_per_question_mb'] * 1024:.1f} KB per question."
+    )
+    sys.exit(0 if summary["rss_growth_per_question_mb"] <= args.max_growth_mb else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import argparse
+import hashlib
+import json
+import mimetypes
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+
+class MockScoringConfig:
+    """Fault injection settings of the mock scoring server."""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0, rate_limit_rate: float = 0, data_dir: str = DATA_DIR):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.data_dir = data_dir
+
+
+class MockScoringHandler(BaseHTTPRequestHandler):
+    """
+    Serves the scoring space API from the local `data/` directory:
+    GET /questions, GET /files/{task_id} and POST /submit.
+    """
+    server_version = "MockScoring/1.0"
+
+    @property
+    def config(self) -> MockScoringConfig:
+        return self.server.config
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json", headers: dict | None = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, data, headers: dict | None = None):
+        self._send(status, json.dumps(data).encode("utf-8"), headers=headers)
+
+    def _inject_faults(self) -> bool:
+        """Sleeps for the configured latency and sends an injected error. Returns True if one was sent."""
+        delay = self.config.latency_ms + random.uniform(-self.config.jitter_ms, self.config.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        roll = random.random()
+        if roll < self.config.rate_limit_rate:
+            self._send_json(429, {"detail": "Too Many Requests (injected)"}, headers={"Retry-After": "1"})
+            return True
+        if roll < self.config.rate_limit_rate + self.config.error_rate:
+            self._send_json(500, {"detail": "Internal Server Error (injected)"})
+            return True
+        return False
+
+    def do_GET(self):
+        if self._inject_faults():
+            return
+        path = urlparse(self.path).path.rstrip("/")
+        if path == "/questions":
+            self._serve_questions()
+        elif path.startswith("/files/"):
+            self._serve_file(path[len("/files/"):])
+        else:
+            self._send_json(404, {"detail": "Not Found"})
+
+    def do_POST(self):
+        if self._inject_faults():
+            return
+        if urlparse(self.path).path.rstrip("/") != "/submit":
+            self._send_json(404, {"detail": "Not Found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            submission_data = json.loads(self.rfile.read(length))
+            if not submission_data.get("username") or not isinstance(submission_data.get("answers"), list):
+                raise ValueError("username and answers are required")
+        except ValueError as e:
+            self._send_json(400, {"detail": f"Invalid submission: {e}"})
+            return
+        self._send_json(200, self.server.score(submission_data))
+
+    def _serve_questions(self):
+        body, etag = self.server.questions()
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self._send(200, body, headers={"ETag": etag})
+
+    def _serve_file(self, task_id: str):
+        file_path = self.server.find_file(task_id)
+        if file_path is None:
+            self._send_json(404, {"detail": f"No file found for task_id {task_id}"})
+            return
+        with open(file_path, "rb") as f:
+            body = f.read()
+        content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        self._send(200, body, content_type=content_type, headers={"Content-Disposition": f'attachment; filename="{os.path.basename(file_path)}"'})
+
+
+class MockScoringServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, address, config: MockScoringConfig, verbose: bool = False):
+        super().__init__(address, MockScoringHandler)
+        self.config = config
+        self.verbose = verbose
+        self._score_lock = threading.Lock()
+        with open(os.path.join(config.data_dir, "questions.json"), "rb") as f:
+            self._questions_body = f.read()
+        self._questions_etag = f'"{hashlib.sha1(self._questions_body).hexdigest()}"'
+        self._file_names = {q["task_id"]: q.get("file_name") for q in json.loads(self._questions_body)}
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def questions(self):
+        return self._questions_body, self._questions_etag
+
+    def find_file(self, task_id: str):
+        """Returns the attachment for a task: the exact file name first, then any file starting with the task_id."""
+        file_name = self._file_names.get(task_id)
+        if file_name and os.path.exists(os.path.join(self.config.data_dir, file_name)):
+            return os.path.join(self.config.data_dir, file_name)
+        if not task_id:
+            return None
+        candidates = sorted(name for name in os.listdir(self.config.data_dir) if name.startswith(task_id))
+        return os.path.join(self.config.data_dir, candidates[0]) if candidates else None
+
+    def score(self, submission_data):
+        # Imported lazily so the server starts fast and only pays for pandas when scoring.
+        from src.submit_questions import mock_scoring_response
+        with self._score_lock:
+            return mock_scoring_response(submission_data)
+
+
+def start_mock_server(host: str = "127.0.0.1", port: int = 0, config: MockScoringConfig | None = None, verbose: bool = False) -> MockScoringServer:
+    """Starts the mock scoring server in a background thread. Port 0 picks a free port."""
+    server = MockScoringServer((host, port), config or MockScoringConfig(), verbose=verbose)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the scoring space, serving questions, files and submissions from data/.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7861)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random +/- variation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0, help="Fraction of requests answered with a 429")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    config = MockScoringConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate, args.data_dir)
+    server = MockScoringServer((args.host, args.port), config, verbose=args.verbose)
+    print(f"Mock scoring server listening on {server.url}")
+    print(f"Use it with: SCORING_API_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,394 @@
+import contextvars
+import hashlib
+import heapq
+import itertools
+import json
 import os
+import threading
+import time
+import litellm
 from smolagents import LiteLLMModel
+from smolagents.models import ChatMessage
+from src.constants import rate_limit_rpm, rate_limit_tpm, rate_limit_max_retries, general_model_id, manager_model_id, model_api_base
+from src.cassette import cassette
 
-general_model = LiteLLMModel(
-    model_id="openai/gpt-4.1-mini",
-    api_base="https://api.openai.com/v1",
+# Lower value is served first when several calls wait for the same model
+MANAGER_PRIORITY = 0
+SUB_AGENT_PRIORITY = 1
+
+# Rough token cost of an image input, used before the real usage is known
+IMAGE_TOKENS_ESTIMATE = 1000
+
+# Set by a streaming run to a callable receiving the partial output of each watched model call
+# and returning the final answer once it is complete, None otherwise.
+final_answer_listener = contextvars.ContextVar("final_answer_listener", default=None)
+# Set per question to a UsageMeter adding up the calls of every scheduled model (manager and sub-agents)
+usage_meter = contextvars.ContextVar("usage_meter", default=None)
+
+class UsageMeter:
+    """
+    Token and call counts of one question, shared by the threads running it.
+    `cached_input_tokens` is the part of `input_tokens` the provider served from its prompt cache.
+    """
+
+    def __init__(self):
+        self.input_tokens = 0
+        self.cached_input_tokens = 0
+        self.output_tokens = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def add(self, input_tokens: int, output_tokens: int, cached_input_tokens: int = 0):
+        with self._lock:
+            self.input_tokens += input_tokens
+            self.cached_input_tokens += cached_input_tokens
+            self.output_tokens += output_tokens
+            self.calls += 1
+
+class FinalAnswerDetected(Exception):
+    """
+    Raised from inside a streamed model call to cancel the generation once the final answer is known.
+    `message` holds what was generated so far and the tokens the cancelled call used.
+    """
+
+    def __init__(self, answer: str, message: ChatMessage):
+        super().__init__(f"Final answer detected: {answer}")
+        self.answer = answer
+        self.message = message
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `capacity` per minute. Can go negative to record debt."""
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available. Amounts above capacity only wait for a full bucket."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing * 60 / self.capacity)
+
+    def consume(self, amount: float):
+        self.tokens -= amount
+
+
+class RateLimitScheduler:
+    """
+    Process-wide scheduler for model API calls.
+    Each model has its own requests-per-minute and tokens-per-minute buckets and a priority queue,
+    so concurrent agents wait for capacity in priority order instead of hitting 429s.
+    """
+
+    def __init__(self, rpm: float = rate_limit_rpm, tpm: float = rate_limit_tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._cond = threading.Condition()
+        self._sequence = itertools.count()
+        self._models = {}
+
+    def _model_state(self, model_id: str) -> dict:
+        if model_id not in self._models:
+            self._models[model_id] = {
+                "rpm": TokenBucket(self.rpm),
+                "tpm": TokenBucket(self.tpm),
+                "queue": [],
+                "paused_until": 0.0,
+                "requests": 0,
+                "tokens": 0,
+                "rate_limited": 0,
+                "total_wait": 0.0,
+                "max_queue_depth": 0,
+            }
+        return self._models[model_id]
+
+    def acquire(self, model_id: str, tokens: float, priority: int = SUB_AGENT_PRIORITY) -> float:
+        """
+        Blocks until the model has capacity for one request of `tokens` tokens and every
+        earlier call with the same or a higher priority went through.
+        Returns the time waited in seconds.
+        """
+        start = time.monotonic()
+        with self._cond:
+            state = self._model_state(model_id)
+            entry = (priority, next(self._sequence))
+            heapq.heappush(state["queue"], entry)
+            state["max_queue_depth"] = max(state["max_queue_depth"], len(state["queue"]))
+            while True:
+                timeout = None
+                if state["queue"][0] == entry:
+                    now = time.monotonic()
+                    timeout = max(
+                        state["paused_until"] - now,
+                        state["rpm"].wait_time(1, now),
+                        state["tpm"].wait_time(tokens, now),
+                    )
+                    if timeout <= 0:
+                        break
+                self._cond.wait(timeout)
+            heapq.heappop(state["queue"])
+            state["rpm"].consume(1)
+            state["tpm"].consume(tokens)
+            state["requests"] += 1
+            state["tokens"] += tokens
+            waited = time.monotonic() - start
+            state["total_wait"] += waited
+            queue_depth = len(state["queue"])
+            self._cond.notify_all()
+        if waited > 1:
+            print(f"Rate limit scheduler: waited {waited:.1f}s for {model_id} ({queue_depth} calls still queued).")
+        return waited
+
+    def reconcile(self, model_id: str, estimated_tokens: float, actual_tokens: float):
+        """Corrects the token bucket once the real usage of a call is known."""
+        with self._cond:
+            state = self._model_state(model_id)
+            state["tpm"].consume(actual_tokens - estimated_tokens)
+            state["tokens"] += actual_tokens - estimated_tokens
+            self._cond.notify_all()
+
+    def pause(self, model_id: str, seconds: float):
+        """Stops all calls to a model for `seconds`, used when the provider still answers with a 429."""
+        with self._cond:
+            state = self._model_state(model_id)
+            state["paused_until"] = max(state["paused_until"], time.monotonic() + seconds)
+            state["rate_limited"] += 1
+
+    def metrics(self) -> dict:
+        """Per model counters: current and max queue depth, requests, tokens, 429s and wait times."""
+        with self._cond:
+            return {
+                model_id: {
+                    "queue_depth": len(state["queue"]),
+                    "max_queue_depth": state["max_queue_depth"],
+                    "requests": state["requests"],
+                    "tokens": int(state["tokens"]),
+                    "rate_limited": state["rate_limited"],
+                    "total_wait": round(state["total_wait"], 3),
+                    "mean_wait": round(state["total_wait"] / state["requests"], 3) if state["requests"] else 0.0,
+                }
+                for model_id, state in self._models.items()
+            }
+
+
+rate_limit_scheduler = RateLimitScheduler()
+
+def estimate_tokens(messages) -> int:
+    """Rough prompt size of chat messages: 4 characters per token plus a flat cost per image."""
+    characters, images = 0, 0
+    for message in messages:
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", message)
+        if isinstance(content, list):
+            for part in content:
+                if isinstance(part, dict) and part.get("type") == "image":
+                    images += 1
+                else:
+                    characters += len(json.dumps(part, default=str))
+        else:
+            characters += len(str(content))
+    return characters // 4 + images * IMAGE_TOKENS_ESTIMATE
+
+def usage_tokens(message: ChatMessage):
+    """(input_tokens, output_tokens) of a model response, read from the response itself and not
+    from the shared model instance, which concurrent calls overwrite."""
+    raw = message.raw
+    if isinstance(raw, dict):
+        usage = raw.get("usage")
+        if usage is None:
+            return raw.get("input_tokens", 0), raw.get("output_tokens", 0)
+    else:
+        usage = getattr(raw, "usage", None)
+    if usage is None:
+        return 0, 0
+    return usage.prompt_tokens, usage.completion_tokens
+
+def cached_tokens(message: ChatMessage) -> int:
+    """Input tokens of a model response served from the provider's prompt cache (OpenAI or Anthropic usage)."""
+    raw = message.raw
+    if isinstance(raw, dict):
+        if "cached_input_tokens" in raw:
+            return raw["cached_input_tokens"]
+        usage = raw.get("usage")
+    else:
+        usage = getattr(raw, "usage", None)
+    if usage is None:
+        return 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None) or getattr(usage, "cache_read_input_tokens", None) or 0
+
+def log_prompt_cache(model_id: str, input_tokens: int, cached_input_tokens: int):
+    if input_tokens:
+        print(f"Prompt cache for {model_id}: {cached_input_tokens}/{input_tokens} input tokens cached ({100 * cached_input_tokens / input_tokens:.0f}%).")
+
+def retry_after_seconds(error: Exception, attempt: int) -> float:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    retry_after = headers.get("retry-after", "")
+    try:
+        return float(retry_after)
+    except ValueError:
+        return 2.0 * 2 ** attempt
+
+
+class ScheduledLiteLLMModel(LiteLLMModel):
+    """
+    LiteLLMModel whose calls go through the process-wide rate limit scheduler.
+    With `watch_final_answer`, calls made while a `final_answer_listener` is set are streamed,
+    and the generation is cancelled with `FinalAnswerDetected` as soon as the listener finds the answer.
+    """
+
+    def __init__(self, *args, priority: int = SUB_AGENT_PRIORITY, scheduler: RateLimitScheduler = rate_limit_scheduler, watch_final_answer: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.priority = priority
+        self.scheduler = scheduler
+        self.watch_final_answer = watch_final_answer
+
+    def _streamed_call(self, messages, listener, stop_sequences=None, grammar=None, tools_to_call_from=None, **kwargs) -> ChatMessage:
+        completion_kwargs = self._prepare_completion_kwargs(
+            messages=messages,
+            stop_sequences=stop_sequences,
+            grammar=grammar,
+            tools_to_call_from=tools_to_call_from,
+            model=self.model_id,
+            api_base=self.api_base,
+            api_key=self.api_key,
+            convert_images_to_image_urls=True,
+            custom_role_conversions=self.custom_role_conversions,
+            **kwargs,
+        )
+        response = self.client.completion(**completion_kwargs, stream=True, stream_options={"include_usage": True})
+        content, usage, answer = "", None, None
+        try:
+            for chunk in response:
+                usage = getattr(chunk, "usage", None) or usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    content += chunk.choices[0].delta.content
+                    answer = listener(content)
+                    if answer is not None:
+                        break
+        finally:
+            close = getattr(getattr(response, "completion_stream", None), "close", None)
+            if close is not None:
+                close()
+        # A cancelled generation has no usage chunk yet: its prompt and output so far are estimated
+        self.last_input_token_count = usage.prompt_tokens if usage else estimate_tokens(messages)
+        self.last_output_token_count = usage.completion_tokens if usage else len(content) // 4
+        message = ChatMessage(role="assistant", content=content, raw={"usage": usage})
+        if usage is None:
+            message.raw["input_tokens"] = self.last_input_token_count
+            message.raw["output_tokens"] = self.last_output_token_count
+        if answer is not None:
+            raise FinalAnswerDetected(answer, message)
+        return self.postprocess_message(message, tools_to_call_from)
+
+    def _scheduled_call(self, messages, listener, *args, **kwargs) -> ChatMessage:
+        estimated_tokens = estimate_tokens(messages)
+        for attempt in range(rate_limit_max_retries + 1):
+            self.scheduler.acquire(self.model_id, estimated_tokens, self.priority)
+            try:
+                if listener is not None:
+                    message = self._streamed_call(messages, listener, *args, **kwargs)
+                else:
+                    message = super().__call__(messages, *args, **kwargs)
+                break
+            except FinalAnswerDetected as e:
+                self.scheduler.reconcile(self.model_id, estimated_tokens, sum(usage_tokens(e.message)))
+                raise
+            except litellm.exceptions.RateLimitError as e:
+                if attempt == rate_limit_max_retries:
+                    raise
+                delay = retry_after_seconds(e, attempt)
+                print(f"Rate limited by the provider for {self.model_id}, pausing calls for {delay:.1f}s.")
+                self.scheduler.pause(self.model_id, delay)
+        self.scheduler.reconcile(self.model_id, estimated_tokens, sum(usage_tokens(message)))
+        return message
+
+    def _recorded_call(self, messages, listener, *args, **kwargs) -> dict:
+        """Real call encoded for the cassette, a cancelled streamed generation included."""
+        try:
+            message = self._scheduled_call(messages, listener, *args, **kwargs)
+        except FinalAnswerDetected as e:
+            input_tokens, output_tokens = usage_tokens(e.message)
+            return {"final_answer_detected": e.answer, "content": e.message.content, "input_tokens": input_tokens, "output_tokens": output_tokens, "cached_input_tokens": cached_tokens(e.message)}
+        input_tokens, output_tokens = usage_tokens(message)
+        return {"role": message.role, "content": message.content, "input_tokens": input_tokens, "output_tokens": output_tokens, "cached_input_tokens": cached_tokens(message)}
+
+    def _meter(self, meter, message: ChatMessage):
+        """Counts the tokens of a call, a cancelled one included, for the question being run."""
+        input_tokens, output_tokens = usage_tokens(message)
+        cached_input_tokens = cached_tokens(message)
+        log_prompt_cache(self.model_id, input_tokens, cached_input_tokens)
+        if meter is not None:
+            meter.add(input_tokens, output_tokens, cached_input_tokens)
+
+    def __call__(self, messages, *args, **kwargs):
+        listener = final_answer_listener.get() if self.watch_final_answer else None
+        # Planning calls describe how to answer, they are never the answer itself
+        if listener is not None and "<end_plan>" in (kwargs.get("stop_sequences") or []):
+            listener = None
+        meter = usage_meter.get()
+        if not cassette.active:
+            try:
+                message = self._scheduled_call(messages, listener, *args, **kwargs)
+            except FinalAnswerDetected as e:
+                self._meter(meter, e.message)
+                raise
+            self._meter(meter, message)
+            return message
+
+        tools = kwargs.get("tools_to_call_from")
+        request = {
+            "model": self.model_id,
+            "messages": messages,
+            "args": args,
+            "kwargs": {**kwargs, "tools_to_call_from": [tool.name for tool in tools] if tools else None},
+        }
+        recorded = cassette.through("chat", request, lambda: self._recorded_call(messages, listener, *args, **kwargs))
+        # Cassettes recorded before cached tokens, or the tokens of cancelled calls, were tracked have none:
+        # usage_tokens and cached_tokens read them as 0
+        message = ChatMessage(role=recorded.get("role", "assistant"), content=recorded.get("content", ""), raw=recorded)
+        self._meter(meter, message)
+        if "final_answer_detected" in recorded:
+            raise FinalAnswerDetected(recorded["final_answer_detected"], message)
+        self.last_input_token_count = recorded["input_tokens"]
+        self.last_output_token_count = recorded["output_tokens"]
+        return message
+
+
+def scheduled_transcription(model: str, file, priority: int = SUB_AGENT_PRIORITY, estimated_tokens: int = IMAGE_TOKENS_ESTIMATE, **kwargs) -> str:
+    """litellm.transcription through the rate limit scheduler and the cassette. Returns the transcribed text."""
+
+    def transcribe():
+        for attempt in range(rate_limit_max_retries + 1):
+            rate_limit_scheduler.acquire(model, estimated_tokens, priority)
+            try:
+                return litellm.transcription(model=model, file=file, **kwargs).text
+            except litellm.exceptions.RateLimitError as e:
+                if attempt == rate_limit_max_retries:
+                    raise
+                rate_limit_scheduler.pause(model, retry_after_seconds(e, attempt))
+
+    with open(file, "rb") as f:
+        file_hash = hashlib.sha256(f.read()).hexdigest()
+    return cassette.through("transcription", {"model": model, "file_sha256": file_hash}, transcribe)
+
+
+general_model = ScheduledLiteLLMModel(
+    model_id=general_model_id,
+    api_base=model_api_base,
+    api_key=os.environ["OPENAI_API_KEY"],
+    priority=SUB_AGENT_PRIORITY,
+)
+
+manager_model = ScheduledLiteLLMModel(
+    model_id=manager_model_id,
+    api_base=model_api_base,
     api_key=os.environ["OPENAI_API_KEY"],
-)
\ No newline at end of file
+    priority=MANAGER_PRIORITY,
+    watch_final_answer=True,
+)
@@ -0,0 +1,35 @@
+import hashlib
+from src.models import estimate_tokens
+
+# Bump when the instructions of any agent change, so stored runs tell which prompts they used
+PROMPTS_VERSION = "2"
+INSTRUCTIONS_HEADER = "Instructions specific to your role:"
+
+
+def add_instructions(agent, instructions: str):
+    """
+    Appends the agent's own instructions to its system prompt template, after the smolagents
+    template (rules, tools and team members), so the whole system prompt stays the same from one
+    call to the next and providers can reuse it from their prompt cache. Variable content (the
+    question, file urls, images) only comes later, in the task message.
+
+    The template is what `run()` renders the system prompt from: appending to
+    `agent.memory.system_prompt` is lost on the first run. Adding the same instructions twice
+    leaves the template unchanged.
+    """
+    # Raw block, so braces in the instructions are not read as Jinja
+    block = f"\n\n{INSTRUCTIONS_HEADER}\n{{% raw %}}{instructions}{{% endraw %}}"
+    template = agent.prompt_templates["system_prompt"]
+    if block not in template:
+        agent.prompt_templates = {**agent.prompt_templates, "system_prompt": template + block}
+    agent.system_prompt = agent.initialize_system_prompt()
+    agent.memory.system_prompt.system_prompt = agent.system_prompt
+    return agent
+
+def prompt_fingerprint(system_prompt: str) -> str:
+    """Short hash of a rendered system prompt: identical fingerprints send identical prefixes."""
+    return hashlib.sha256(system_prompt.encode()).hexdigest()[:12]
+
+def describe_prompt(agent) -> str:
+    system_prompt = agent.initialize_system_prompt()
+    return f"{agent.name} system prompt v{PROMPTS_VERSION}: {prompt_fingerprint(system_prompt)}, ~{estimate_tokens([{'content': system_prompt}])} tokens"
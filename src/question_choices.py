@@ -1,14 +1,8 @@
-from src.question_fetcher import fetch_questions
+from src.question_store import question_store
 
 def get_question_choices():
     """
-    Fetches questions and returns a tuple (choices, index_map).
-    - choices: List of question strings for UI selection.
-    - index_map: Dict mapping question string to its index in the original list.
+    Returns the questions as (question string, task_id) pairs for UI selection.
+    Does not block: returns an empty list while the question store is still loading.
     """
-    err, questions_data = fetch_questions()
-    if err or not questions_data:
-        return [], {}
-    choices = [q.get("question", f"Question {i}") for i, q in enumerate(questions_data)]
-    index_map = {q: i for i, q in enumerate(choices)}
-    return choices, index_map
+    return question_store.choices()
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+from src.constants import questions_url, questions_refresh_seconds
+
+LOCAL_QUESTIONS_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "questions.json")
+
+def text_hash(question_text: str) -> str:
+    return hashlib.sha1(question_text.strip().encode("utf-8")).hexdigest()
+
+def attachment_type(item: dict) -> str:
+    """Lowercase extension of the question attachment, e.g. '.png', or '' when there is none."""
+    return os.path.splitext(item.get("file_name") or "")[1].lower()
+
+class QuestionStore:
+    """
+    Questions loaded once from the scoring API (or `data/questions.json` as a fallback),
+    indexed by task_id, attachment type and question text hash.
+    The API is revalidated in the background with ETags, so a refresh that finds
+    nothing new costs a 304 and does not rebuild the indexes.
+    """
+
+    def __init__(self, url: str = questions_url, local_path: str = LOCAL_QUESTIONS_PATH):
+        self.url = url
+        self.local_path = local_path
+        self.questions = []
+        self.by_task_id = {}
+        self.by_attachment_type = {}
+        self.by_text_hash = {}
+        self.etag = None
+        self.source = None
+        self.loaded = threading.Event()
+        self._lock = threading.Lock()
+        self._refresh_thread = None
+
+    def _index(self, questions_data: list, source: str, etag: str | None = None):
+        by_task_id, by_attachment_type, by_text_hash = {}, {}, {}
+        for item in questions_data:
+            task_id = item.get("task_id")
+            if not task_id:
+                continue
+            by_task_id[task_id] = item
+            by_attachment_type.setdefault(attachment_type(item), []).append(item)
+            by_text_hash[text_hash(item.get("question") or "")] = item
+        with self._lock:
+            self.questions = questions_data
+            self.by_task_id = by_task_id
+            self.by_attachment_type = by_attachment_type
+            self.by_text_hash = by_text_hash
+            self.etag = etag
+            self.source = source
+        self.loaded.set()
+
+    def load_local(self):
+        """
+        Loads the questions from the local questions.json file.
+        Returns: error_message_or_None
+        """
+        try:
+            with open(self.local_path, "r", encoding="utf-8") as f:
+                questions_data = json.load(f)
+        except Exception as e:
+            print(f"Error loading local questions.json: {e}")
+            return f"Error loading local questions.json: {e}"
+        if not questions_data:
+            print("Local questions.json is empty or invalid format.")
+            return "Local questions.json is empty or invalid format."
+        self._index(questions_data, source=self.local_path)
+        print(f"Loaded {len(questions_data)} questions from local file.")
+        return None
+
+    def refresh(self):
+        """
+        Revalidates the questions against the API, falling back to the local file
+        on a 429 when nothing is loaded yet.
+        Returns: error_message_or_None
+        """
+        headers = {"If-None-Match": self.etag} if self.etag else {}
+        print(f"Fetching questions from: {self.url}")
+        try:
+            response = requests.get(self.url, headers=headers, timeout=15)
+            if response.status_code == 304:
+                print("Questions are up to date.")
+                return None
+            response.raise_for_status()
+            questions_data = response.json()
+        except requests.exceptions.JSONDecodeError as e:
+            print(f"Error decoding JSON response from questions endpoint: {e}")
+            return f"Error decoding server response for questions: {e}"
+        except requests.exceptions.RequestException as e:
+            if getattr(e, "response", None) is not None and e.response.status_code == 429:
+                if self.loaded.is_set():
+                    print("Received 429 Too Many Requests. Keeping the questions already loaded.")
+                    return None
+                print("Received 429 Too Many Requests. Falling back to local questions.json file.")
+                return self.load_local()
+            print(f"Error fetching questions: {e}")
+            return f"Error fetching questions: {e}"
+        if not questions_data:
+            print("Fetched questions list is empty.")
+            return "Fetched questions list is empty or invalid format."
+        self._index(questions_data, source=self.url, etag=response.headers.get("ETag"))
+        print(f"Fetched {len(questions_data)} questions.")
+        return None
+
+    def start_background_refresh(self, interval: float = questions_refresh_seconds):
+        """
+        Loads the questions in a background thread and revalidates them every `interval` seconds.
+        The local file is used when the first API load fails, so the UI always gets questions.
+        """
+        if self._refresh_thread is not None:
+            return
+
+        def refresh_loop():
+            if self.refresh() and not self.loaded.is_set():
+                self.load_local()
+            while interval > 0:
+                time.sleep(interval)
+                self.refresh()
+
+        self._refresh_thread = threading.Thread(target=refresh_loop, name="question-store-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def wait_until_loaded(self, timeout: float = 20) -> bool:
+        """Waits for the background load, if one was started. Returns whether questions are loaded."""
+        if self._refresh_thread is None:
+            return self.loaded.is_set()
+        return self.loaded.wait(timeout)
+
+    def all(self) -> list:
+        with self._lock:
+            return list(self.questions)
+
+    def get(self, task_id: str):
+        return self.by_task_id.get(task_id)
+
+    def find_by_text(self, question_text: str):
+        return self.by_text_hash.get(text_hash(question_text or ""))
+
+    def with_attachment_type(self, extension: str) -> list:
+        """Questions whose attachment has the given extension, '' for questions without attachment."""
+        return list(self.by_attachment_type.get(extension.lower(), []))
+
+    def choices(self) -> list:
+        """(label, task_id) pairs for UI selection."""
+        return [(item.get("question", task_id), task_id) for task_id, item in self.by_task_id.items()]
+
+
+question_store = QuestionStore()
@@ -0,0 +1,191 @@
+import argparse
+import glob
+import os
+import time
+import uuid
+from dataclasses import dataclass, field, fields
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.constants import results_dir
+from src.scoring import score_answers, load_answer_key
+
+# Column names of the UI results table
+VIEW_COLUMNS = {"task_id": "Task ID", "question": "Question", "submitted_answer": "Submitted Answer", "duration": "Duration"}
+
+
+@dataclass(slots=True)
+class RunResult:
+    """One question of a run, with numeric timings and usage."""
+
+    run_id: str
+    task_id: str
+    question: str
+    submitted_answer: str
+    duration_seconds: float
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+    output_tokens: int = 0
+    model_calls: int = 0
+    steps: int = 0
+    error: str | None = None
+    prompt_version: str = ""
+    finished_at: float = field(default_factory=time.time)
+
+    def answer_payload(self):
+        """Payload for the scoring API, or None when the agent failed."""
+        if self.error is not None:
+            return None
+        return {"task_id": self.task_id, "submitted_answer": self.submitted_answer}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RunResult":
+        names = {f.name for f in fields(cls)}
+        return cls(**{key: value for key, value in data.items() if key in names})
+
+
+RESULTS_SCHEMA = pa.schema([
+    ("run_id", pa.string()),
+    ("task_id", pa.string()),
+    ("question", pa.string()),
+    ("submitted_answer", pa.string()),
+    ("duration_seconds", pa.float64()),
+    ("input_tokens", pa.int64()),
+    ("cached_input_tokens", pa.int64()),
+    ("output_tokens", pa.int64()),
+    ("model_calls", pa.int64()),
+    ("steps", pa.int64()),
+    ("error", pa.string()),
+    ("prompt_version", pa.string()),
+    ("finished_at", pa.float64()),
+])
+
+def format_duration(duration: float) -> str:
+    if duration < 60:
+        return f"{duration:.2f} seconds"
+    mins = int(duration // 60)
+    secs = duration % 60
+    return f"{mins}m {secs:.2f}s"
+
+def new_run_id() -> str:
+    """Sortable run identifier: UTC start time and a random suffix."""
+    return time.strftime("%Y%m%dT%H%M%SZ", time.gmtime()) + "-" + uuid.uuid4().hex[:6]
+
+def results_table(results) -> pa.Table:
+    """Arrow table of RunResult records, built column by column."""
+    columns = {name: [getattr(result, name) for result in results] for name in RESULTS_SCHEMA.names}
+    return pa.Table.from_pydict(columns, schema=RESULTS_SCHEMA)
+
+def results_view(results) -> pd.DataFrame:
+    """
+    UI table of a run: Task ID, Question, Submitted Answer and a formatted Duration.
+    Accepts RunResult records, a results DataFrame or legacy result log dicts.
+    """
+    if isinstance(results, pd.DataFrame):
+        frame = results
+    elif results and isinstance(results[0], RunResult):
+        frame = results_table(results).to_pandas()
+    else:
+        return pd.DataFrame(results)
+    if frame.empty:
+        return pd.DataFrame(columns=list(VIEW_COLUMNS.values()))
+    view = frame[["task_id", "question", "submitted_answer"]].copy()
+    view["duration"] = frame["duration_seconds"].map(format_duration)
+    return view.rename(columns=VIEW_COLUMNS)
+
+
+class RunResultsStore:
+    """
+    Results of one run, written to `<results_dir>/<run_id>.parquet` after every question,
+    so an interrupted run keeps what it answered.
+    """
+
+    def __init__(self, run_id: str | None = None, directory: str = results_dir):
+        self.run_id = run_id or new_run_id()
+        self.directory = directory
+        self.path = os.path.join(directory, f"{self.run_id}.parquet")
+        self.results = []
+
+    def add(self, result: RunResult, write: bool = True):
+        """Adds (or replaces, by task_id) the result of a question."""
+        result.run_id = self.run_id
+        self.results = [r for r in self.results if r.task_id != result.task_id] + [result]
+        if write:
+            self.write()
+
+    def write(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        pq.write_table(results_table(self.results), tmp_path, compression="zstd")
+        os.replace(tmp_path, self.path)
+
+    def view(self) -> pd.DataFrame:
+        return results_view(self.results)
+
+
+def load_runs(directory: str = results_dir, run_ids=None) -> pd.DataFrame:
+    """
+    All stored results as one DataFrame (one row per run and question), read as a single Arrow dataset.
+    Args:
+        directory: Directory of the run files.
+        run_ids: Only load these runs.
+    """
+    paths = sorted(glob.glob(os.path.join(directory, "*.parquet")))
+    if run_ids is not None:
+        wanted = set(run_ids)
+        paths = [path for path in paths if os.path.splitext(os.path.basename(path))[0] in wanted]
+    if not paths:
+        return results_table([]).to_pandas()
+    return pq.ParquetDataset(paths, schema=RESULTS_SCHEMA).read().to_pandas()
+
+def compare_runs(runs: pd.DataFrame, answer_key: pd.Series | None = None) -> pd.DataFrame:
+    """
+    Per-run summary of many runs: score against the local answer key, errors, timings and usage
+    (cache_hit is the percentage of input tokens served from the provider's prompt cache).
+    Returns one row per run_id, best score first, then most recent.
+    """
+    if answer_key is None:
+        answer_key = load_answer_key()
+    if runs.empty:
+        return pd.DataFrame()
+    scored = score_answers(runs, answer_key)
+    summary = scored.groupby("run_id").agg(
+        questions=("task_id", "nunique"),
+        correct=("correct", "sum"),
+        scored=("correct", "count"),
+        errors=("error", "count"),
+        total_seconds=("duration_seconds", "sum"),
+        median_seconds=("duration_seconds", "median"),
+        p95_seconds=("duration_seconds", lambda durations: durations.quantile(0.95)),
+        input_tokens=("input_tokens", "sum"),
+        cached_input_tokens=("cached_input_tokens", "sum"),
+        output_tokens=("output_tokens", "sum"),
+        mean_steps=("steps", "mean"),
+        finished_at=("finished_at", "max"),
+    )
+    summary["score"] = 100 * summary["correct"] / summary["scored"].where(summary["scored"] > 0)
+    summary["cache_hit"] = 100 * summary["cached_input_tokens"] / summary["input_tokens"].where(summary["input_tokens"] > 0)
+    return summary.sort_values(["score", "finished_at"], ascending=False)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the stored runs against the local answer key.")
+    parser.add_argument("run_ids", nargs="*", help="Only compare these runs (all stored runs by default)")
+    parser.add_argument("--results-dir", default=results_dir)
+    parser.add_argument("--last", type=int, help="Only show the most recent runs")
+    args = parser.parse_args()
+
+    start = time.time()
+    runs = load_runs(args.results_dir, args.run_ids or None)
+    summary = compare_runs(runs)
+    if summary.empty:
+        print(f"No runs stored in {args.results_dir}.")
+        return
+    if args.last:
+        summary = summary.nlargest(args.last, "finished_at")
+    summary["finished_at"] = pd.to_datetime(summary["finished_at"], unit="s").dt.strftime("%Y-%m-%d %H:%M")
+    print(summary.to_string(float_format=lambda value: f"{value:.2f}"))
+    print(f"Compared {summary.shape[0]} runs ({len(runs)} results) in {time.time() - start:.2f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+import json
+import os
+import queue
+import select
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from src.constants import sandbox_pool_size, sandbox_cpu_seconds, sandbox_memory_mb, sandbox_timeout, sandbox_require_isolation, sandbox_hidden_paths
+
+WORKER_TIMEOUT_MARGIN = 5
+
+# Source of the worker process. It is run with `python -I -c` so it does not depend on the
+# repository being importable, and talks to the pool with one JSON object per line over a
+# private copy of its stdin/stdout. At startup the worker moves to its own user, network and
+# mount namespaces (no network interface, hidden paths). Every snippet then runs in a child
+# forked for it, so the code never touches the warm interpreter: the child is limited in CPU,
+# memory and process creation, and sends its result back over a pipe before exiting.
+WORKER_SOURCE = r"""
+import builtins, contextlib, ctypes, ctypes.util, errno, io, json, os, resource, select, signal, sys, time, traceback
+
+config = json.loads(sys.argv[1])
+CLONE_NEWNS, CLONE_NEWUSER, CLONE_NEWNET, CLONE_THREAD = 0x00020000, 0x10000000, 0x40000000, 0x00010000
+MS_RDONLY, MS_NOSUID, MS_NODEV, MS_BIND, MS_REC, MS_PRIVATE = 0x1, 0x2, 0x4, 0x1000, 0x4000, 0x40000
+SCMP_ACT_ALLOW, SCMP_CMP_MASKED_EQ = 0x7FFF0000, 7
+
+class ScmpArgCmp(ctypes.Structure):
+    _fields_ = [("arg", ctypes.c_uint), ("op", ctypes.c_int), ("datum_a", ctypes.c_uint64), ("datum_b", ctypes.c_uint64)]
+
+def _check(result, what):
+    if result != 0:
+        code = ctypes.get_errno()
+        raise OSError(code, f"{what}: {os.strerror(code)}")
+
+def _isolate():
+    libc = ctypes.CDLL(None, use_errno=True)
+    _check(libc.unshare(CLONE_NEWUSER | CLONE_NEWNET | CLONE_NEWNS), "unshare")
+    _check(libc.mount(b"none", b"/", None, MS_REC | MS_PRIVATE, None), "mount --make-rprivate /")
+    for path in config["hidden_paths"]:
+        if os.path.isdir(path):
+            _check(libc.mount(b"tmpfs", path.encode(), b"tmpfs", MS_RDONLY | MS_NOSUID | MS_NODEV, b"size=4k"), f"hide {path}")
+        elif os.path.isfile(path):
+            _check(libc.mount(os.devnull.encode(), path.encode(), None, MS_BIND, None), f"hide {path}")
+
+def _load_seccomp():
+    path = ctypes.util.find_library("seccomp")
+    if path is None:
+        raise OSError(errno.ENOENT, "libseccomp is not installed")
+    seccomp = ctypes.CDLL(path)
+    seccomp.seccomp_init.restype = ctypes.c_void_p
+    seccomp.seccomp_init.argtypes = [ctypes.c_uint32]
+    seccomp.seccomp_rule_add_array.argtypes = [ctypes.c_void_p, ctypes.c_uint32, ctypes.c_int, ctypes.c_uint, ctypes.POINTER(ScmpArgCmp)]
+    seccomp.seccomp_load.argtypes = [ctypes.c_void_p]
+    seccomp.seccomp_syscall_resolve_name.argtypes = [ctypes.c_char_p]
+    return seccomp
+
+def _deny_processes(seccomp):
+    # Root ignores RLIMIT_NPROC: new processes and programs are also refused by a seccomp filter.
+    # Threads (clone with CLONE_THREAD) stay allowed, clone3 reports ENOSYS so libc falls back to clone.
+    deny = lambda code: 0x00050000 | code
+    context = seccomp.seccomp_init(SCMP_ACT_ALLOW)
+    rules = [(name, deny(errno.EPERM), None) for name in (b"fork", b"vfork", b"execve", b"execveat")]
+    rules += [(b"clone", deny(errno.EPERM), ScmpArgCmp(0, SCMP_CMP_MASKED_EQ, CLONE_THREAD, 0)), (b"clone3", deny(errno.ENOSYS), None)]
+    for name, action, condition in rules:
+        number = seccomp.seccomp_syscall_resolve_name(name)
+        if number >= 0:
+            _check(seccomp.seccomp_rule_add_array(context, action, number, 0 if condition is None else 1, None if condition is None else ctypes.byref(condition)), f"seccomp rule {name.decode()}")
+    _check(seccomp.seccomp_load(context), "seccomp_load")
+
+proto_in = os.fdopen(os.dup(0), "r")
+proto_out = os.fdopen(os.dup(1), "w")
+devnull = os.open(os.devnull, os.O_RDWR)
+os.dup2(devnull, 0)
+os.dup2(devnull, 1)
+sys.stdin = open(os.devnull)
+
+def reply(message):
+    proto_out.write(json.dumps(message) + "\n")
+    proto_out.flush()
+
+seccomp, isolation_error = None, None
+try:
+    seccomp = _load_seccomp()
+    _isolate()
+except OSError as e:
+    isolation_error = str(e)
+    if config["require_isolation"]:
+        reply({"ready": False, "error": f"Sandbox isolation unavailable ({isolation_error})."})
+        sys.exit(1)
+reply({"ready": True, "isolation_error": isolation_error})
+
+def run_child(request, result_fd):
+    # Only the result pipe and stdin/stdout/stderr (all /dev/null) stay open
+    os.closerange(3, result_fd)
+    os.closerange(result_fd + 1, 1 << 16)
+    cpu_seconds = max(1, int(request["cpu_seconds"] + 0.999))
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    if config["memory_bytes"] > 0:
+        resource.setrlimit(resource.RLIMIT_AS, (config["memory_bytes"], config["memory_bytes"]))
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    if isolation_error is None:
+        _deny_processes(seccomp)
+    stdout, stderr = io.StringIO(), io.StringIO()
+    error = None
+    start = time.time()
+    try:
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            code = compile(request["code"], request["filename"], "exec")
+            exec(code, {"__name__": "__main__", "__builtins__": dict(builtins.__dict__)})
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            error = f"SystemExit: {e.code}"
+    except BaseException:
+        error = traceback.format_exc(limit=-5)
+    with os.fdopen(result_fd, "w") as result:
+        result.write(json.dumps({
+            "stdout": stdout.getvalue()[:config["max_output"]],
+            "stderr": stderr.getvalue()[:config["max_output"]],
+            "error": error,
+            "duration": time.time() - start,
+        }))
+
+def run(request):
+    read_fd, write_fd = os.pipe()
+    start = time.time()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(read_fd)
+            run_child(request, write_fd)
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    chunks, timed_out = [], False
+    deadline = start + request["timeout"]
+    with os.fdopen(read_fd, "rb") as reader:
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0 or not select.select([reader], [], [], remaining)[0]:
+                timed_out = True
+                os.kill(pid, signal.SIGKILL)
+                break
+            chunk = os.read(read_fd, 65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    _, status = os.waitpid(pid, 0)
+    failure = {"stdout": "", "stderr": "", "duration": time.time() - start, "timed_out": timed_out}
+    if timed_out:
+        return {**failure, "error": f"Execution timed out after {request['timeout']} seconds."}
+    if os.WIFSIGNALED(status) or not chunks:
+        return {**failure, "error": "Sandbox run was killed (CPU or memory limit exceeded)."}
+    return {**json.loads(b"".join(chunks)), "timed_out": False}
+
+for line in proto_in:
+    reply(run(json.loads(line)))
+"""
+
+class SandboxWorker:
+    """
+    A single pre-started Python subprocess that executes code snippets on request, each one
+    in a child process forked for it. The worker runs in its own temporary working directory,
+    without network and with hidden paths; runs have a CPU time limit, an address space limit
+    and can't start processes.
+    """
+
+    def __init__(self, memory_mb: int, max_output: int, require_isolation: bool = sandbox_require_isolation, hidden_paths=sandbox_hidden_paths):
+        self.workdir = tempfile.mkdtemp(prefix="sandbox-")
+        config = {
+            "memory_bytes": memory_mb * 1024 * 1024,
+            "max_output": max_output,
+            "require_isolation": require_isolation,
+            "hidden_paths": list(hidden_paths),
+        }
+        self.process = subprocess.Popen(
+            [sys.executable, "-I", "-c", WORKER_SOURCE, json.dumps(config)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=self.workdir,
+            env={"PATH": os.environ.get("PATH", ""), "PYTHONIOENCODING": "utf-8", "OPENBLAS_NUM_THREADS": "1", "OMP_NUM_THREADS": "1"},
+            text=True,
+            start_new_session=True,
+        )
+        ready = self._read_line(timeout=30)
+        if ready is None or not ready.get("ready"):
+            self.kill()
+            raise RuntimeError((ready or {}).get("error") or "Sandbox worker failed to start.")
+        if ready.get("isolation_error"):
+            print(f"Warning: sandbox running without isolation ({ready['isolation_error']}): snippets have network access and can start processes.")
+
+    def _read_line(self, timeout: float):
+        ready, _, _ = select.select([self.process.stdout], [], [], timeout)
+        if not ready:
+            return None
+        line = self.process.stdout.readline()
+        if not line:
+            self.process.wait(timeout=5)
+            return None
+        return json.loads(line)
+
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+
+    def execute(self, code: str, filename: str, cpu_seconds: float, timeout: float) -> dict:
+        """
+        Sends one snippet to the worker and waits for its result.
+        Returns a dict with 'stdout', 'stderr', 'error', 'duration' and 'timed_out' keys.
+        """
+        request = {"code": code, "filename": filename, "cpu_seconds": cpu_seconds, "timeout": timeout}
+        start = time.time()
+        try:
+            self.process.stdin.write(json.dumps(request) + "\n")
+            self.process.stdin.flush()
+            # The worker enforces the timeout on its child, the margin only catches a stuck worker
+            result = self._read_line(timeout + WORKER_TIMEOUT_MARGIN)
+        except (BrokenPipeError, OSError, ValueError) as e:
+            return {"stdout": "", "stderr": "", "error": f"Sandbox worker failure: {e}", "duration": time.time() - start, "timed_out": False}
+        if result is None:
+            self.kill()
+            return {"stdout": "", "stderr": "", "error": "Sandbox worker stopped responding.", "duration": time.time() - start, "timed_out": True}
+        return result
+
+    def kill(self):
+        if self.is_alive():
+            self.process.kill()
+        self.process.wait()
+        for stream in (self.process.stdin, self.process.stdout):
+            try:
+                stream.close()
+            except Exception:
+                pass
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class SandboxPool:
+    """
+    Pool of pre-warmed sandbox workers shared across questions.
+    Workers are reused between runs (each run is a fresh child forked by the worker) and
+    replaced in the background whenever one dies.
+    """
+
+    def __init__(self, size: int = 2, cpu_seconds: float = 10, memory_mb: int = 512, timeout: float = 30, max_output: int = 20000):
+        self.size = max(1, size)
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.timeout = timeout
+        self.max_output = max_output
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = 0
+
+    def _spawn(self, raise_errors: bool = False):
+        try:
+            self._idle.put(SandboxWorker(self.memory_mb, self.max_output))
+        except Exception as e:
+            print(f"Error starting sandbox worker: {e}")
+            with self._lock:
+                self._started -= 1
+            if raise_errors:
+                raise
+
+    def warm(self, background: bool = False):
+        """Starts workers until the pool is full."""
+        with self._lock:
+            missing = self.size - self._started
+            self._started += missing
+        for _ in range(missing):
+            if background:
+                threading.Thread(target=self._spawn, daemon=True).start()
+            else:
+                self._spawn()
+
+    def _acquire(self) -> SandboxWorker:
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            # Workers that failed to start in the background free their place, it is retried here
+            # so a failure (e.g. isolation unavailable) reaches the caller instead of waiting forever
+            with self._lock:
+                can_spawn = self._started < self.size
+                if can_spawn:
+                    self._started += 1
+            if can_spawn:
+                self._spawn(raise_errors=True)
+                continue
+            try:
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                pass
+
+    def _release(self, worker: SandboxWorker):
+        if worker.is_alive():
+            self._idle.put(worker)
+            return
+        worker.kill()
+        threading.Thread(target=self._spawn, daemon=True).start()
+
+    def run(self, code: str, filename: str = "<sandbox>", timeout: float | None = None) -> dict:
+        """
+        Executes code in a pooled sandbox and returns its captured output.
+        Args:
+            code: Python source to execute as `__main__`.
+            filename: Name shown in tracebacks.
+            timeout: Wall-clock limit in seconds, defaults to the pool timeout.
+        Returns:
+            dict with 'stdout', 'stderr', 'error', 'duration' and 'timed_out' keys.
+        """
+        worker = self._acquire()
+        try:
+            return worker.execute(code, filename, self.cpu_seconds, timeout or self.timeout)
+        finally:
+            self._release(worker)
+
+    def run_file(self, file_path: os.PathLike, timeout: float | None = None) -> dict:
+        with open(file_path, "r", encoding="utf-8") as f:
+            code = f.read()
+        return self.run(code, filename=os.path.basename(file_path), timeout=timeout)
+
+    def shutdown(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.kill()
+            with self._lock:
+                self._started -= 1
+
+
+def format_sandbox_result(result: dict) -> str:
+    """Formats a sandbox result as the text returned to agents."""
+    output = result.get("stdout", "")
+    if result.get("error"):
+        output += f"\n{result['stderr']}\nError: {result['error']}"
+    return output.strip() or "The code ran without printing anything."
+
+
+sandbox_pool = SandboxPool(
+    size=sandbox_pool_size,
+    cpu_seconds=sandbox_cpu_seconds,
+    memory_mb=sandbox_memory_mb,
+    timeout=sandbox_timeout,
+)
@@ -0,0 +1,265 @@
+import ast
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+from src.constants import answer_key_path
+
+# Patterns are compiled once at import, every function below is called per answer or per run.
+FINAL_ANSWER_RE = re.compile(r"FINAL ANSWER:\s*\[?([^\]\n]+)\]?|FINAL ANSWER:\s*([^\n]+)", re.IGNORECASE)
+ANSWER_RE = re.compile(r"ANSWER:\s*\[?([^\]\n]+)\]?", re.IGNORECASE)
+NUMBER_RE = re.compile(r"^[\s$€£]*[-+]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?\s*(?:%|percent)?\s*$", re.IGNORECASE)
+NUMBER_NOISE_RE = re.compile(r"[$€£%,\s]|percent", re.IGNORECASE)
+LIST_SPLIT_RE = re.compile(r"\s*[,;]\s*")
+WHITESPACE_RE = re.compile(r"\s+")
+PUNCTUATION_RE = re.compile(r"[!\"#$%&'()*+,\-./:;<=>?@\[\\\]^_`{|}~]")
+ARTICLE_RE = re.compile(r"(?:^|[,;]\s*)(?:a|an|the)\s", re.IGNORECASE)
+# Quotes and brackets removed when one pair encloses the whole answer
+WRAPPING_PAIRS = {'"': '"', "'": "'", "`": "`", "(": ")", "[": "]"}
+# Used on intermediate output: only lines starting with the template and literal final_answer(...) calls count,
+# and on partial model output the line must be complete
+PARTIAL_FINAL_ANSWER_RE = re.compile(r"^[ \t]*FINAL ANSWER:[ \t]*\[?([^\]\n]+?)\]?[ \t]*\n", re.MULTILINE)
+COMPLETE_FINAL_ANSWER_RE = re.compile(r"^[ \t]*FINAL ANSWER:[ \t]*\[?([^\]\n]+?)\]?[ \t]*$", re.MULTILINE)
+# Closed code blocks of a CodeAgent output; an unclosed block is still being generated
+CODE_BLOCK_RE = re.compile(r"```(?:py|python)?[ \t]*\n(.*?)\n?```", re.DOTALL)
+TEMPLATE_PLACEHOLDER = "YOUR FINAL ANSWER"
+
+
+def extract_final_answer(response: str) -> str:
+    """
+    Extracts the answer following 'FINAL ANSWER:' (or 'ANSWER:') from an agent output.
+    Returns the whole response when no template is found.
+    """
+    if response is None:
+        return ""
+    match = FINAL_ANSWER_RE.search(response) or ANSWER_RE.search(response)
+    if match:
+        return next(group for group in match.groups() if group is not None).strip()
+    return response
+
+
+def _literal_final_answer(code: str):
+    """The argument of `final_answer(<literal>)` when it is the only top-level statement of the code, else None."""
+    try:
+        body = ast.parse(code).body
+    except SyntaxError:
+        return None
+    if len(body) != 1 or not isinstance(body[0], ast.Expr) or not isinstance(body[0].value, ast.Call):
+        return None
+    call = body[0].value
+    if not isinstance(call.func, ast.Name) or call.func.id != "final_answer":
+        return None
+    arguments = call.args + [keyword.value for keyword in call.keywords if keyword.arg == "answer"]
+    if len(arguments) != 1 or len(call.args) + len(call.keywords) != 1:
+        return None
+    try:
+        value = ast.literal_eval(arguments[0])
+    except ValueError:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return None
+    return str(value)
+
+
+def find_final_answer(output: str, partial: bool = True):
+    r"""
+    Detects a final answer in streamed or intermediate output: a 'FINAL ANSWER: ...' line, or
+    a closed code block whose only statement is a final_answer(...) call with a literal argument,
+    so the answer is known before the code runs. A call anywhere else (in the thought, or after
+    other statements that may not reach it) is left to the executed step.
+    With `partial`, the output is still being generated and the answer line must be finished.
+    Returns the answer, or None while no final answer is complete.
+
+    >>> find_final_answer('Thought: done.\nCode:\n```py\nfinal_answer("Paris")\n```')
+    'Paris'
+    >>> find_final_answer('Thought: I will answer final_answer("unknown") if the search fails.\nCode:\n```py\nprint(search())\n```')
+    >>> find_final_answer('Code:\n```py\nif count > 3:\n    final_answer("yes")\n```')
+    >>> find_final_answer('Code:\n```py\nfinal_answer("Paris")')
+    >>> find_final_answer("Thought: found it.\nFINAL ANSWER: 42\n")
+    '42'
+    """
+    if not output:
+        return None
+    match = (PARTIAL_FINAL_ANSWER_RE if partial else COMPLETE_FINAL_ANSWER_RE).search(output)
+    if match and match.group(1).strip() != TEMPLATE_PLACEHOLDER:
+        return match.group(1).strip()
+    for block in CODE_BLOCK_RE.finditer(output):
+        answer = _literal_final_answer(block.group(1))
+        if answer is not None:
+            return answer
+    return None
+
+
+def _encloses(answer: str) -> bool:
+    """Whether the first and last characters of the answer are one matching quote or bracket pair."""
+    opening, closing = answer[0], answer[-1]
+    if WRAPPING_PAIRS.get(opening) != closing:
+        return False
+    if opening == closing:
+        return opening not in answer[1:-1]
+    depth = 0
+    for index, char in enumerate(answer):
+        depth += (char == opening) - (char == closing)
+        if depth == 0:
+            return index == len(answer) - 1
+    return False
+
+
+def normalize_answer(answer: str) -> str:
+    """
+    Cleans a submitted answer following the GAIA formatting rules:
+    numbers lose their thousands separators and units, list items are joined with ', '
+    and quotes or brackets enclosing the whole answer are removed. Any other punctuation is
+    kept, as it can be part of the answer.
+    Articles are reported by `score_answers` but never removed, as they can be part of a name.
+
+    >>> normalize_answer('["Paris"]')
+    'Paris'
+    >>> normalize_answer("Saint Petersburg (Russia)")
+    'Saint Petersburg (Russia)'
+    >>> normalize_answer("f(x)")
+    'f(x)'
+    >>> normalize_answer("(a) first")
+    '(a) first'
+    >>> normalize_answer("(a) and (b)")
+    '(a) and (b)'
+    >>> normalize_answer("U.S.")
+    'U.S.'
+    >>> normalize_answer("$1,234.5")
+    '1234.5'
+    >>> normalize_answer("[b; a ,c]")
+    'b, a, c'
+    """
+    if answer is None:
+        return ""
+    answer = str(answer).strip()
+    while len(answer) >= 2 and _encloses(answer):
+        answer = answer[1:-1].strip()
+    if NUMBER_RE.match(answer):
+        return NUMBER_NOISE_RE.sub("", answer)
+    if "," in answer or ";" in answer:
+        return ", ".join(item for item in LIST_SPLIT_RE.split(answer) if item)
+    return answer
+
+
+def load_answer_key(path: str | None = None) -> pd.Series:
+    """
+    Loads a local answer key, either a {task_id: answer} mapping or the GAIA metadata
+    format (a list of dicts with 'task_id' and 'Final answer' keys).
+    Returns an empty Series when the file does not exist.
+    """
+    path = path or answer_key_path
+    if not os.path.exists(path):
+        print(f"No local answer key found at {path}.")
+        return pd.Series(dtype=object, name="expected_answer")
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {item["task_id"]: item.get("Final answer", item.get("final_answer")) for item in data}
+    key = pd.Series(data, dtype=object, name="expected_answer")
+    key.index.name = "task_id"
+    return key.astype(str)
+
+
+def _normalize_strings(values: pd.Series, remove_punct: bool) -> pd.Series:
+    values = values.str.replace(WHITESPACE_RE, "", regex=True)
+    if remove_punct:
+        values = values.str.replace(PUNCTUATION_RE, "", regex=True)
+    return values.str.lower()
+
+
+def _to_numbers(values: pd.Series) -> pd.Series:
+    return pd.to_numeric(values.str.replace(NUMBER_NOISE_RE, "", regex=True), errors="coerce")
+
+
+def _compare_elements(submitted: pd.Series, expected: pd.Series) -> pd.Series:
+    """Element-wise GAIA comparison: numeric when the expected value is a number, string otherwise."""
+    expected_numbers = pd.to_numeric(expected, errors="coerce")
+    is_number = expected_numbers.notna().to_numpy()
+    numbers_equal = (_to_numbers(submitted) == expected_numbers).to_numpy()
+    strings_equal = (
+        _normalize_strings(submitted, remove_punct=False) == _normalize_strings(expected, remove_punct=False)
+    ).to_numpy()
+    return pd.Series(np.where(is_number, numbers_equal, strings_equal), index=submitted.index)
+
+
+def _score_lists(submitted: pd.Series, expected: pd.Series) -> pd.Series:
+    """Scores comma/semicolon separated answers: same length and every element matching."""
+    submitted_items = submitted.str.split(LIST_SPLIT_RE, regex=True)
+    expected_items = expected.str.split(LIST_SPLIT_RE, regex=True)
+    same_length = submitted_items.str.len() == expected_items.str.len()
+    rows = same_length[same_length].index
+    if len(rows) == 0:
+        return same_length
+    exploded_submitted = submitted_items[rows].explode()
+    exploded_expected = expected_items[rows].explode()
+    matches = _compare_elements(exploded_submitted.astype(str), exploded_expected.astype(str))
+    all_match = matches.groupby(level=0).all()
+    return same_length & all_match.reindex(same_length.index, fill_value=False)
+
+
+def score_answers(answers, answer_key: pd.Series | None = None) -> pd.DataFrame:
+    """
+    Scores answers against the local answer key with the GAIA scorer rules, vectorized over all rows.
+    Args:
+        answers: DataFrame (or list of answer payload dicts) with 'task_id' and 'submitted_answer'
+            columns. Any other column, e.g. 'run_id', is kept.
+        answer_key: Series of expected answers indexed by task_id, loaded from disk by default.
+    Returns:
+        pd.DataFrame: The answers with 'expected_answer', 'correct' and 'format_warning' columns.
+            Rows without an expected answer have a missing 'correct' value.
+
+    >>> key = pd.Series({"t1": "1, 2, 3", "t2": "Saint Petersburg (Russia)", "t3": "4, 5"})
+    >>> answers = [("t1", "[1; 2; 3]"), ("t2", "Saint Petersburg (Russia)"), ("t3", "45")]
+    >>> score_answers(pd.DataFrame(answers, columns=["task_id", "submitted_answer"]), key)["correct"].tolist()
+    [True, True, False]
+    """
+    if answer_key is None:
+        answer_key = load_answer_key()
+    frame = pd.DataFrame(answers).reset_index(drop=True)
+    frame = frame.join(answer_key.rename("expected_answer"), on="task_id")
+    submitted = frame["submitted_answer"].fillna("").astype(str).map(normalize_answer)
+    known = frame["expected_answer"].notna()
+    expected = frame["expected_answer"].fillna("").astype(str)
+
+    # Like the GAIA scorer, only an expected answer that parses as a float as-is is a number
+    expected_numbers = pd.to_numeric(expected.str.strip(), errors="coerce")
+    is_number = expected_numbers.notna()
+    is_list = ~is_number & expected.str.contains(r"[,;]", regex=True)
+
+    numbers_correct = _to_numbers(submitted) == expected_numbers
+    strings_correct = _normalize_strings(submitted, remove_punct=True) == _normalize_strings(expected, remove_punct=True)
+    correct = np.where(is_number, numbers_correct, strings_correct)
+    if is_list.any():
+        correct[is_list.to_numpy()] = _score_lists(submitted[is_list], expected[is_list]).to_numpy()
+
+    frame["correct"] = pd.Series(correct, dtype="boolean").where(known)
+    frame["format_warning"] = np.select(
+        [
+            submitted.str.contains(ARTICLE_RE, regex=True),
+            ~submitted.str.match(NUMBER_RE) & submitted.str.contains(r"\d", regex=True) & is_number,
+        ],
+        ["article", "number with units or text"],
+        default="",
+    )
+    return frame
+
+
+def score_runs(runs: pd.DataFrame, answer_key: pd.Series | None = None) -> pd.DataFrame:
+    """
+    Scores many runs at once.
+    Args:
+        runs: DataFrame with 'run_id', 'task_id' and 'submitted_answer' columns.
+        answer_key: Series of expected answers indexed by task_id, loaded from disk by default.
+    Returns:
+        pd.DataFrame: One row per run with 'correct', 'scored', 'attempted' and 'score' (in %) columns.
+    """
+    scored = score_answers(runs, answer_key)
+    summary = scored.groupby("run_id").agg(
+        correct=("correct", "sum"),
+        scored=("correct", "count"),
+        attempted=("task_id", "nunique"),
+    )
+    summary["score"] = 100 * summary["correct"] / summary["scored"].where(summary["scored"] > 0)
+    return summary.sort_values("score", ascending=False)
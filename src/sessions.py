@@ -0,0 +1,132 @@
+import itertools
+import os
+import shutil
+import threading
+import time
+from src.constants import sessions_dir, session_ttl_seconds, max_concurrent_runs
+
+class RunSlots:
+    """
+    Global limit on the number of agent runs executing at once, served first come first served.
+    `acquire` is a generator yielding the queue position while the run waits, so the UI
+    can show it, and returning once the run holds a slot.
+    """
+
+    def __init__(self, limit: int = max_concurrent_runs):
+        self.limit = limit
+        self.active = 0
+        self.waiting = []
+        self._tickets = itertools.count()
+        self._condition = threading.Condition()
+
+    def _can_start(self, ticket: int) -> bool:
+        return self.waiting[0] == ticket and self.active < self.limit
+
+    def acquire(self, poll_seconds: float = 1.0):
+        ticket = next(self._tickets)
+        with self._condition:
+            self.waiting.append(ticket)
+        try:
+            while True:
+                with self._condition:
+                    if self._condition.wait_for(lambda: self._can_start(ticket), timeout=poll_seconds):
+                        self.waiting.remove(ticket)
+                        self.active += 1
+                        # The next ticket may fit in a free slot too
+                        self._condition.notify_all()
+                        return
+                    position = self.waiting.index(ticket) + 1
+                yield position
+        except BaseException:
+            # A run abandoned while waiting (e.g. closed page) leaves the queue
+            with self._condition:
+                if ticket in self.waiting:
+                    self.waiting.remove(ticket)
+                    self._condition.notify_all()
+            raise
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+    def status(self) -> dict:
+        with self._condition:
+            return {"active": self.active, "waiting": len(self.waiting), "limit": self.limit}
+
+
+class Session:
+    """Per-browser-session state: its own agent and scratch directory for downloaded attachments."""
+
+    def __init__(self, session_id: str, root: str):
+        self.session_id = session_id
+        self.scratch_dir = os.path.join(root, session_id)
+        self.agent = None
+        self.last_used = time.time()
+        # One run at a time per session, as its agent keeps the state of the run in progress
+        self.lock = threading.Lock()
+        self._agent_lock = threading.Lock()
+
+    def get_agent(self, factory):
+        """The session's agent, built by `factory(scratch_dir)` on first use."""
+        with self._agent_lock:
+            if self.agent is None:
+                self.agent = factory(self.scratch_dir)
+            return self.agent
+
+
+class SessionManager:
+    """
+    Sessions keyed by the Gradio session hash, created on first use and dropped (scratch
+    directory included) once idle for `ttl` seconds.
+    """
+
+    def __init__(self, root: str = sessions_dir, ttl: float = session_ttl_seconds, slots: RunSlots | None = None):
+        self.root = root
+        self.ttl = ttl
+        self.slots = slots or RunSlots()
+        self.sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Session:
+        self.evict_idle()
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self.sessions[session_id] = Session(session_id, self.root)
+            session.last_used = time.time()
+            return session
+
+    def evict_idle(self):
+        now = time.time()
+        with self._lock:
+            idle = [s for s in self.sessions.values() if now - s.last_used > self.ttl and not s.lock.locked()]
+            for session in idle:
+                del self.sessions[session.session_id]
+        for session in idle:
+            shutil.rmtree(session.scratch_dir, ignore_errors=True)
+            print(f"Session {session.session_id} dropped after {self.ttl:.0f}s idle.")
+
+    def queue(self, session: Session):
+        """
+        Generator waiting for the session's previous run and then for a global run slot,
+        yielding status messages meanwhile. Once it is exhausted the run holds its slot,
+        to be freed with `release`.
+        """
+        while not session.lock.acquire(timeout=1.0):
+            yield "This session is already running a question, waiting for it to finish..."
+        try:
+            for position in self.slots.acquire():
+                status = self.slots.status()
+                yield f"Waiting for a free run slot: position {position} in the queue ({status['active']}/{status['limit']} runs in progress)."
+        except BaseException:
+            session.lock.release()
+            raise
+
+    def release(self, session: Session):
+        session.last_used = time.time()
+        self.slots.release()
+        session.lock.release()
+
+
+session_manager = SessionManager()
@@ -0,0 +1,243 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+
+# Each sharded run gets its own results directory under this one, named after its run id
+DEFAULT_RESULTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "shards")
+
+def shard_of(task_id: str, num_shards: int) -> int:
+    """Stable shard index of a task, identical across processes and machines."""
+    return int(hashlib.sha1(task_id.encode("utf-8")).hexdigest(), 16) % num_shards
+
+def shard_path(results_dir: str, shard_index: int, num_shards: int) -> str:
+    return os.path.join(results_dir, f"shard-{shard_index}-of-{num_shards}.json")
+
+def load_shard(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"results": [], "answers": []}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_shard(path: str, shard: dict):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(shard, f, indent=2)
+    os.replace(tmp_path, path)
+
+def shard_run_id(results_dir: str) -> str:
+    """
+    Run id shared by all shards writing to `results_dir`, created by the first shard to start.
+    The file is created exclusively, so shards started at the same time agree on one id.
+    """
+    from src.results_store import new_run_id
+
+    path = os.path.join(results_dir, "run_id")
+    os.makedirs(results_dir, exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+    except FileExistsError:
+        for _ in range(50):
+            with open(path, "r", encoding="utf-8") as f:
+                run_id = f.read().strip()
+            if run_id:
+                return run_id
+            time.sleep(0.1)
+        raise RuntimeError(f"Empty run id file {path}")
+    run_id = new_run_id()
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(run_id)
+    return run_id
+
+def new_results_dir(root: str = DEFAULT_RESULTS_DIR) -> str:
+    """Creates the results directory of a new sharded run, `<root>/<run_id>`."""
+    from src.results_store import new_run_id
+
+    run_id = new_run_id()
+    results_dir = os.path.join(root, run_id)
+    os.makedirs(results_dir)
+    with open(os.path.join(results_dir, "run_id"), "w", encoding="utf-8") as f:
+        f.write(run_id)
+    return results_dir
+
+def latest_results_dir(root: str = DEFAULT_RESULTS_DIR):
+    """Results directory of the last sharded run created under `root` (run ids sort by start time), or None."""
+    runs = [path for path in glob.glob(os.path.join(root, "*")) if os.path.isfile(os.path.join(path, "run_id"))]
+    return max(runs, key=os.path.basename, default=None)
+
+def run_shard(shard_index: int, num_shards: int, results_dir: str) -> int:
+    """
+    Runs the agent on the questions of one shard and writes them to the shard results file
+    after each question. Questions already answered in the file are skipped, so a crashed
+    shard can be restarted. Returns the process exit code.
+    """
+    from src.agent import ManagerAgent, call_agent
+    from src.question_fetcher import fetch_questions
+
+    err, questions_data = fetch_questions()
+    if err:
+        print(err)
+        return 1
+    path = shard_path(results_dir, shard_index, num_shards)
+    shard = load_shard(path)
+    answered = {answer["task_id"] for answer in shard["answers"]}
+    todo = [
+        item for item in questions_data
+        if item.get("task_id") and shard_of(item["task_id"], num_shards) == shard_index and item["task_id"] not in answered
+    ]
+    print(f"Shard {shard_index}/{num_shards}: {len(todo)} questions to run, {len(answered)} already answered.")
+    if not todo:
+        return 0
+
+    agent = ManagerAgent()
+    run_id = shard_run_id(results_dir)
+    for item in todo:
+        result = call_agent(agent, item, run_id)
+        if result is None:
+            continue
+        shard["results"] = [r for r in shard["results"] if r["task_id"] != item["task_id"]] + [asdict(result)]
+        if result.answer_payload() is not None:
+            shard["answers"].append(result.answer_payload())
+        save_shard(path, shard)
+    return 0
+
+def launch_shards(num_shards: int, results_dir: str, shard_indexes=None) -> int:
+    """
+    Runs shards as separate local processes and waits for all of them.
+    Each process has its own rate limit scheduler, so the OPENAI_RPM/OPENAI_TPM limits are split
+    evenly between the shards launched here.
+    """
+    from src.constants import rate_limit_rpm, rate_limit_tpm
+
+    shard_indexes = range(num_shards) if shard_indexes is None else shard_indexes
+    print(f"Run id: {shard_run_id(results_dir)}")
+    local_shards = max(len(shard_indexes), 1)
+    env = {**os.environ, "OPENAI_RPM": str(rate_limit_rpm / local_shards), "OPENAI_TPM": str(rate_limit_tpm / local_shards)}
+    print(f"Rate limits per shard: {env['OPENAI_RPM']} requests and {env['OPENAI_TPM']} tokens per minute")
+    processes = []
+    for shard_index in shard_indexes:
+        command = [
+            sys.executable, "-m", "src.shard_runner", "run",
+            "--shard-index", str(shard_index), "--num-shards", str(num_shards), "--results-dir", results_dir,
+        ]
+        log_path = os.path.join(results_dir, f"shard-{shard_index}-of-{num_shards}.log")
+        os.makedirs(results_dir, exist_ok=True)
+        log_file = open(log_path, "w", encoding="utf-8")
+        processes.append((shard_index, subprocess.Popen(command, stdout=log_file, stderr=subprocess.STDOUT, env=env), log_file))
+        print(f"Started shard {shard_index}/{num_shards}, logging to {log_path}")
+
+    exit_code = 0
+    for shard_index, process, log_file in processes:
+        process.wait()
+        log_file.close()
+        print(f"Shard {shard_index}/{num_shards} finished with exit code {process.returncode}")
+        exit_code = exit_code or process.returncode
+    return exit_code
+
+def merge_shards(results_dir: str, num_shards: int):
+    """
+    Reads all shard results files of a run.
+    Returns a tuple: (results, answers_payload, missing_shard_indexes), results being RunResult records.
+    """
+    from src.results_store import RunResult
+
+    results, answers_payload, missing = [], [], []
+    for shard_index in range(num_shards):
+        path = shard_path(results_dir, shard_index, num_shards)
+        if not os.path.exists(path):
+            missing.append(shard_index)
+            continue
+        shard = load_shard(path)
+        results.extend(RunResult.from_dict(result) for result in shard["results"])
+        answers_payload.extend(shard["answers"])
+    return results, answers_payload, missing
+
+def detect_num_shards(results_dir: str):
+    paths = glob.glob(os.path.join(results_dir, "shard-*-of-*.json"))
+    counts = {int(os.path.basename(p).rsplit("-of-", 1)[1].split(".")[0]) for p in paths}
+    if len(counts) != 1:
+        return None
+    return counts.pop()
+
+def submit_merged(results_dir: str, num_shards: int | None, username: str) -> int:
+    from src.constants import agent_code
+    from src.results_store import RunResultsStore
+    from src.submit_questions import SubmissionManager
+
+    num_shards = num_shards or detect_num_shards(results_dir)
+    if not num_shards:
+        print(f"Could not detect the number of shards in {results_dir}, pass --num-shards.")
+        return 1
+    results, answers_payload, missing = merge_shards(results_dir, num_shards)
+    if missing:
+        print(f"Warning: no results for shards {missing}.")
+    # The merged run is stored with the other runs
+    results_store = RunResultsStore(run_id=shard_run_id(results_dir))
+    for result in results:
+        results_store.add(result, write=False)
+    if results:
+        results_store.write()
+        print(f"Stored {len(results)} results in {results_store.path}")
+    if not answers_payload:
+        print("No answers to submit.")
+        return 1
+    print(f"Merged {len(answers_payload)} answers from {num_shards - len(missing)} shards.")
+    submission_manager = SubmissionManager(username, agent_code, batch_size=len(answers_payload) + 1)
+    for answer_payload in answers_payload:
+        submission_manager.add(answer_payload)
+    status, results_df = submission_manager.submit(results_store.results)
+    print(results_df.to_string(index=False))
+    return 0 if status.startswith(("Submission Successful", "Mock Submission Successful")) else 1
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the evaluation sharded by task_id across processes or machines, then merge and submit once.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run one shard in this process")
+    run_parser.add_argument("--shard-index", type=int, required=True)
+    run_parser.add_argument("--num-shards", type=int, required=True)
+    run_parser.add_argument("--results-dir", required=True, help="Directory shared by all shards of the run")
+
+    launch_parser = subparsers.add_parser("launch", help="Run all shards as local processes")
+    launch_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of shards/processes")
+    launch_parser.add_argument("--shards", type=int, nargs="*", help="Only launch these shard indexes, e.g. the ones assigned to this machine")
+    launch_parser.add_argument("--results-dir", help="Resume the run of this directory (a new directory under data/shards by default)")
+    launch_parser.add_argument("--resume", action="store_true", help="Resume the last run under data/shards, skipping the questions it answered")
+    launch_parser.add_argument("--username", help="Merge and submit once all shards finished")
+
+    merge_parser = subparsers.add_parser("merge", help="Merge the shard results and submit them once")
+    merge_parser.add_argument("--username", required=True)
+    merge_parser.add_argument("--num-shards", type=int, help="Detected from the results files by default")
+    merge_parser.add_argument("--results-dir", help="Directory of the run to merge (the last run under data/shards by default)")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        sys.exit(run_shard(args.shard_index, args.num_shards, args.results_dir))
+    if args.command == "launch":
+        if args.results_dir is None:
+            args.results_dir = latest_results_dir() if args.resume else new_results_dir()
+        if args.results_dir is None:
+            print(f"No sharded run to resume in {DEFAULT_RESULTS_DIR}.")
+            sys.exit(1)
+        print(f"Results directory: {args.results_dir}")
+        start = time.time()
+        exit_code = launch_shards(args.workers, args.results_dir, args.shards)
+        print(f"All shards finished in {time.time() - start:.2f} seconds.")
+        if args.username:
+            exit_code = submit_merged(args.results_dir, args.workers, args.username) or exit_code
+        sys.exit(exit_code)
+    results_dir = args.results_dir or latest_results_dir()
+    if results_dir is None:
+        print(f"No sharded run to merge in {DEFAULT_RESULTS_DIR}.")
+        sys.exit(1)
+    sys.exit(submit_merged(results_dir, args.num_shards, args.username))
+
+
+if __name__ == "__main__":
+    main()
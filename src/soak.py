@@ -0,0 +1,145 @@
+import argparse
+import contextlib
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+class SoakStats:
+    """Thread-safe latency and outcome counters per path."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.outcomes = {}
+
+    def record(self, path: str, latency: float, outcome: str):
+        with self._lock:
+            self.latencies.setdefault(path, []).append(latency)
+            counts = self.outcomes.setdefault(path, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+
+    def report(self, elapsed: float) -> str:
+        lines = [f"{'path':<10}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  outcomes"]
+        total = 0
+        for path, latencies in sorted(self.latencies.items()):
+            total += len(latencies)
+            ms = sorted(latency * 1000 for latency in latencies)
+            outcomes = ", ".join(f"{name}={count}" for name, count in sorted(self.outcomes[path].items()))
+            lines.append(
+                f"{path:<10}{len(ms):>10}{len(ms) / elapsed:>10.1f}{percentile(ms, 50):>10.1f}{percentile(ms, 95):>10.1f}{percentile(ms, 99):>10.1f}  {outcomes}"
+            )
+        lines.append(f"Total: {total} requests in {elapsed:.2f}s ({total / elapsed:.1f} req/s)")
+        return "\n".join(lines)
+
+
+def run_soak(concurrency: int, total_requests: int, duration: float | None, weights: dict, submit_retries: int) -> SoakStats:
+    """
+    Drives the app's fetch, file and submit paths from `concurrency` threads until
+    `total_requests` requests are sent or `duration` seconds have elapsed.
+    """
+    # Imported here so SCORING_API_URL can be set before the constants are evaluated.
+    import requests
+    from src.constants import files_url, questions_url
+    from src.question_fetcher import fetch_questions
+    from src.submit_questions import post_submission
+
+    err, questions_data = fetch_questions(use_cache=False)
+    if err:
+        raise RuntimeError(err)
+    file_task_ids = [q["task_id"] for q in questions_data if q.get("file_name")]
+    answers = [{"task_id": q["task_id"], "submitted_answer": "soak"} for q in questions_data]
+    submission_data = {"username": "soak-test", "agent_code": "soak", "answers": answers}
+
+    def fetch():
+        # A plain GET: fetch_questions falls back to local data on errors and revalidates with ETags,
+        # which would hide the server's 429/5xx responses
+        response = requests.get(questions_url, timeout=30)
+        return str(response.status_code)
+
+    def download_file():
+        response = requests.get(f"{files_url}/{random.choice(file_task_ids)}", timeout=30)
+        return str(response.status_code)
+
+    def submit():
+        post_submission(submission_data, max_retries=submit_retries, backoff=0.1)
+        return "ok"
+
+    operations = {"fetch": fetch, "files": download_file, "submit": submit}
+    paths = [path for path in operations if weights.get(path, 0) > 0]
+    path_weights = [weights[path] for path in paths]
+    stats = SoakStats()
+    sent = 0
+    sent_lock = threading.Lock()
+    deadline = time.time() + duration if duration else None
+
+    def worker():
+        nonlocal sent
+        while True:
+            with sent_lock:
+                if sent >= total_requests or (deadline and time.time() >= deadline):
+                    return
+                sent += 1
+            path = random.choices(paths, weights=path_weights)[0]
+            start = time.perf_counter()
+            try:
+                outcome = operations[path]()
+            except requests.exceptions.HTTPError as e:
+                outcome = str(e.response.status_code)
+            except Exception as e:
+                outcome = type(e).__name__
+            stats.record(path, time.perf_counter() - start, outcome)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak test of the fetch, file and submit paths against a scoring server.")
+    parser.add_argument("--base-url", help="Scoring server to hit. Defaults to a local mock server started in-process.")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000, help="Total number of requests to send")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds")
+    parser.add_argument("--fetch-weight", type=float, default=1)
+    parser.add_argument("--files-weight", type=float, default=2)
+    parser.add_argument("--submit-weight", type=float, default=1)
+    parser.add_argument("--submit-retries", type=int, default=0, help="Retries of post_submission on 429/5xx")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Mock server: added latency")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Mock server: latency variation")
+    parser.add_argument("--error-rate", type=float, default=0, help="Mock server: fraction of 500 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=0, help="Mock server: fraction of 429 responses")
+    args = parser.parse_args()
+
+    server = None
+    if args.base_url:
+        os.environ["SCORING_API_URL"] = args.base_url
+    else:
+        from src.mock_server import MockScoringConfig, start_mock_server
+        config = MockScoringConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate)
+        server = start_mock_server(config=config)
+        os.environ["SCORING_API_URL"] = server.url
+    print(f"Soak testing {os.environ['SCORING_API_URL']} with {args.concurrency} workers...")
+
+    weights = {"fetch": args.fetch_weight, "files": args.files_weight, "submit": args.submit_weight}
+    start = time.perf_counter()
+    # The app's fetch and submit paths print on every call, silence them during the run.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        stats = run_soak(args.concurrency, args.requests, args.duration, weights, args.submit_retries)
+    print(stats.report(time.perf_counter() - start))
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,88 +1,195 @@
+import json
+import os
+import re
+import threading
+import time
 import requests
 import pandas as pd
-from src.constants import submit_url, is_dry_run
+from src.constants import submit_url, is_dry_run, submissions_dir, submit_batch_size, submit_max_retries
+from src.scoring import load_answer_key, score_answers
+from src.results_store import results_view
 
-def submit_answers(submission_data, results_log):
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Several sessions can submit for the same user at once, their merges into the user's file are serialized
+_store_locks = {}
+_store_locks_lock = threading.Lock()
+
+def _store_lock(path):
+    with _store_locks_lock:
+        return _store_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+def format_submission_status(result_data, title="Submission Successful!"):
+    return (
+        f"{title}\n"
+        f"User: {result_data.get('username')}\n"
+        f"Overall Score: {result_data.get('score', 'N/A')}% "
+        f"({result_data.get('correct_count', '?')}/{result_data.get('total_attempted', '?')} correct)\n"
+        f"Message: {result_data.get('message', 'No message received.')}"
+    )
+
+def post_submission(submission_data, max_retries=submit_max_retries, backoff=2.0):
     """
-    Submits answers to the specified URL and returns a tuple of (status_message, results_df).
+    Posts a submission, retrying on network errors, 429 and 5xx responses with exponential backoff.
+    The payload always holds the full answer set, so retrying it is idempotent.
     Args:
         submission_data (dict): The payload containing submission details.
-        results_log (list): The log of results to be displayed in the DataFrame.
+        max_retries (int): Number of retries after the first attempt.
+        backoff (float): Delay in seconds before the first retry, doubled after each retry.
     Returns:
-        Tuple[str, pd.DataFrame]: Status message and results DataFrame.
+        dict: The server response.
+    Raises:
+        requests.exceptions.RequestException: When the last attempt fails or the error is not retryable.
     """
-    # Check if DRY_RUN environment variable is set to "true"
-    if is_dry_run:
-        return mock_submit_answers(submission_data, results_log)
-
-
-    print(f"Submitting {len(submission_data['answers'])} answers to: {submit_url}")
-    print(f"Submission payload: {submission_data}")
-    try:
-        response = requests.post(submit_url, json=submission_data, timeout=60)
-        response.raise_for_status()
-        result_data = response.json()
-        final_status = (
-            f"Submission Successful!\n"
-            f"User: {result_data.get('username')}\n"
-            f"Overall Score: {result_data.get('score', 'N/A')}% "
-            f"({result_data.get('correct_count', '?')}/{result_data.get('total_attempted', '?')} correct)\n"
-            f"Message: {result_data.get('message', 'No message received.')}"
-        )
-        print("Submission successful.")
-        print(final_status)
-        results_df = pd.DataFrame(results_log)
-        return final_status, results_df
-    except requests.exceptions.HTTPError as e:
-        error_detail = f"Server responded with status {e.response.status_code}."
+    for attempt in range(max_retries + 1):
         try:
-            error_json = e.response.json()
-            error_detail += f" Detail: {error_json.get('detail', e.response.text)}"
-        except requests.exceptions.JSONDecodeError:
-            error_detail += f" Response: {e.response.text}"
-        status_message = f"Submission Failed: {error_detail}"
-        print(status_message)
-        results_df = pd.DataFrame(results_log)
-        return status_message, results_df
-    except requests.exceptions.RequestException as e:
-        status_message = f"Submission Failed: Network error - {e}"
-        print(status_message)
-        results_df = pd.DataFrame(results_log)
-        return status_message, results_df
-    except Exception as e:
-        status_message = f"An unexpected error occurred during submission: {e}"
-        print(status_message)
-        results_df = pd.DataFrame(results_log)
-        return status_message, results_df
-
-def mock_submit_answers(submission_data, results_log):
+            response = requests.post(submit_url, json=submission_data, timeout=60)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code not in RETRYABLE_STATUS_CODES or attempt == max_retries:
+                raise
+            retry_after = e.response.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.isdigit() else backoff * 2 ** attempt
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == max_retries:
+                raise
+            delay = backoff * 2 ** attempt
+        print(f"Submission attempt {attempt + 1} failed, retrying in {delay:.1f}s...")
+        time.sleep(delay)
+
+def mock_scoring_response(submission_data, answer_key=None):
     """
-    Mocks the submit_answers function for testing purposes.
-    Args:
-        submission_data (dict): The payload containing submission details.
-        results_log (list): The log of results to be displayed in the DataFrame.
-    Returns:
-        Tuple[str, pd.DataFrame]: Status message and results DataFrame.
+    Local stand-in for the scoring server: scores the submission against the local answer key
+    and returns a response shaped like the server's.
     """
-    print(f"MOCK: Would submit {len(submission_data['answers'])} answers to: {submit_url}")
-    
-    # Create mock response data
-    mock_result = {
-        "username": "test_user",
-        "score": 75.0,
-        "correct_count": 3,
-        "total_attempted": 4,
-        "message": "This is a mock submission response."
+    if answer_key is None:
+        answer_key = load_answer_key()
+    answers = submission_data["answers"]
+    correct_count = 0
+    if answers and not answer_key.empty:
+        correct_count = int(score_answers(answers, answer_key)["correct"].fillna(False).sum())
+    total_questions = len(answer_key) or len(answers)
+    message = "Scored against the local answer key." if not answer_key.empty else "No local answer key, nothing was scored."
+    return {
+        "username": submission_data.get("username"),
+        "score": round(100 * correct_count / total_questions, 2) if total_questions else 0.0,
+        "correct_count": correct_count,
+        "total_attempted": len(answers),
+        "message": f"Mock submission. {message}",
     }
-    
-    final_status = (
-        f"Mock Submission Successful!\n"
-        f"User: {mock_result.get('username')}\n"
-        f"Overall Score: {mock_result.get('score', 'N/A')}% "
-        f"({mock_result.get('correct_count', '?')}/{mock_result.get('total_attempted', '?')} correct)\n"
-        f"Message: {mock_result.get('message', 'No message received.')}"
-    )
-    
-    print("Mock submission successful.")
-    results_df = pd.DataFrame(results_log)
-    return final_status, results_df
+
+class SubmissionManager:
+    """
+    Collects answers during a run and submits them in batches.
+    Answers are deduplicated by task_id and merged with the best answers previously stored
+    for the user in `submissions_dir`, so that every post holds the full best answer set:
+    a single-question run never overwrites earlier answers, and a failed post loses nothing.
+    """
+
+    def __init__(self, username, agent_code, batch_size=submit_batch_size, store_path=None):
+        self.username = username.strip()
+        self.agent_code = agent_code
+        self.batch_size = batch_size
+        safe_username = re.sub(r"[^A-Za-z0-9_.-]", "_", self.username) or "anonymous"
+        self.store_path = store_path or os.path.join(submissions_dir, f"{safe_username}.json")
+        self.answer_key = load_answer_key()
+        self.best_answers = self._load()
+        self.pending = {}
+        self.last_result = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if not os.path.exists(self.store_path):
+            return {}
+        try:
+            with open(self.store_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading previous answers from {self.store_path}: {e}")
+            return {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.store_path) or ".", exist_ok=True)
+        tmp_path = f"{self.store_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.best_answers, f, indent=2)
+        os.replace(tmp_path, self.store_path)
+
+    @staticmethod
+    def _is_better(new, old):
+        new_correct, old_correct = new.get("correct") is True, old.get("correct") is True
+        if new_correct != old_correct:
+            return new_correct
+        return bool(new["submitted_answer"].strip()) or not old["submitted_answer"].strip()
+
+    def add(self, answer_payload):
+        """Queues an answer payload, flushing once `batch_size` new answers are pending."""
+        if answer_payload is None:
+            return
+        with self._lock:
+            self.pending[answer_payload["task_id"]] = answer_payload
+            should_flush = len(self.pending) >= self.batch_size
+        if should_flush:
+            self.flush()
+
+    def _merge_pending(self):
+        if not self.pending:
+            return
+        with _store_lock(self.store_path):
+            # Another session of the same user may have saved answers since this manager loaded them
+            self.best_answers = self._load()
+            self._merge(list(self.pending.values()))
+            self.pending = {}
+            self._save()
+
+    def _merge(self, pending):
+        correct = [None] * len(pending)
+        if not self.answer_key.empty:
+            correct = [None if pd.isna(c) else bool(c) for c in score_answers(pending, self.answer_key)["correct"]]
+        for answer, is_correct in zip(pending, correct):
+            candidate = {"submitted_answer": str(answer["submitted_answer"]), "correct": is_correct, "updated_at": time.time()}
+            previous = self.best_answers.get(answer["task_id"])
+            if previous is None or self._is_better(candidate, previous):
+                self.best_answers[answer["task_id"]] = candidate
+
+    def submission_data(self):
+        answers = [{"task_id": task_id, "submitted_answer": best["submitted_answer"]} for task_id, best in self.best_answers.items()]
+        return {"username": self.username, "agent_code": self.agent_code, "answers": answers}
+
+    def flush(self):
+        """
+        Merges pending answers into the stored best answers and posts the full set.
+        Returns:
+            Tuple[str | None, dict | None]: (error_message_or_None, server_response_or_None)
+        """
+        with self._lock:
+            self._merge_pending()
+            submission_data = self.submission_data()
+            if not submission_data["answers"]:
+                return "No answers to submit.", None
+            print(f"Submitting {len(submission_data['answers'])} merged answers for user '{self.username}'...")
+            try:
+                if is_dry_run:
+                    self.last_result = mock_scoring_response(submission_data, self.answer_key)
+                else:
+                    self.last_result = post_submission(submission_data)
+                return None, self.last_result
+            except requests.exceptions.HTTPError as e:
+                return f"Submission Failed: Server responded with status {e.response.status_code}. Response: {e.response.text}", None
+            except requests.exceptions.RequestException as e:
+                return f"Submission Failed: Network error - {e}", None
+
+    def submit(self, results_log):
+        """
+        Flushes all pending answers and returns a tuple of (status_message, results_df) for the UI.
+        `results_log` holds the RunResult records (or result log dicts) of the run.
+        """
+        err, result_data = self.flush()
+        results_df = results_view(results_log)
+        if err:
+            print(err)
+            return err, results_df
+        title = "Mock Submission Successful!" if is_dry_run else "Submission Successful!"
+        final_status = format_submission_status(result_data, title=title)
+        print(final_status)
+        return final_status, results_df
@@ -1,7 +1,8 @@
 import os
 import requests
 from urllib.parse import urlparse
-from litellm import transcription
+from src.constants import default_scratch_dir
+from src.models import scheduled_transcription
 # from transformers import pipeline
 from smolagents import Tool, SpeechToTextTool, LiteLLMModel
 from pathlib import Path
@@ -12,7 +13,7 @@ def audio_to_text(audio_file_path: os.PathLike) -> str:
     try:
         print(f"Processing audio file: {audio_file_path}")
 
-        output = transcription(model="openai/gpt-4o-mini-transcribe", file=audio_file_path, api_key=os.environ["OPENAI_API_KEY"])
+        output = scheduled_transcription(model="openai/gpt-4o-mini-transcribe", file=audio_file_path, api_key=os.environ["OPENAI_API_KEY"])
         return output
         # asr = pipeline("automatic-speech-recognition", model="openai/whisper-large-v3-turbo", model_kwargs={"api_key": os.environ["OPENAI_API_KEY"]})
         # result = asr(audio_file_path)
@@ -35,12 +36,16 @@ class AudioUrlToTextTool(Tool):
         }
     }
     output_type = "string"
+
+    def __init__(self, scratch_dir: str = default_scratch_dir):
+        super().__init__()
+        self.scratch_dir = scratch_dir
     
     def forward(self, audio_url: str, file_extension: str) -> str:
         try:
-            os.makedirs("./data", exist_ok=True)
+            os.makedirs(self.scratch_dir, exist_ok=True)
             file_name = os.path.basename(urlparse(audio_url).path) or "audio_file"
-            file_path = Path(os.path.join("./data", file_name + file_extension))
+            file_path = Path(os.path.join(self.scratch_dir, file_name + file_extension))
             # Download file
             try:
                 response = requests.get(audio_url, timeout=30)
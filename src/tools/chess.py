@@ -1,6 +1,72 @@
 import chess
 from smolagents import Tool, CodeAgent
+from src.constants import chess_search_depth
 from src.models import general_model
+from src.prompts import add_instructions
+from src.tools.general import base_tools
+
+PIECE_VALUES = {chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330, chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0}
+MATE_SCORE = 100000
+QUIESCENCE_MAX_DEPTH = 6
+
+def _material(board: chess.Board) -> int:
+    """Material balance from the side to move's point of view."""
+    return sum(
+        PIECE_VALUES[piece.piece_type] if piece.color == board.turn else -PIECE_VALUES[piece.piece_type]
+        for piece in board.piece_map().values()
+    )
+
+def _ordered_moves(board: chess.Board) -> list:
+    # Checks then captures first, they cut the search the most
+    return sorted(board.legal_moves, key=lambda move: (not board.gives_check(move), not board.is_capture(move)))
+
+def _quiescence(board: chess.Board, alpha: int, beta: int, depth: int = 0) -> int:
+    stand_pat = _material(board)
+    if stand_pat >= beta:
+        return beta
+    alpha = max(alpha, stand_pat)
+    if depth >= QUIESCENCE_MAX_DEPTH:
+        return alpha
+    for move in board.legal_moves:
+        if not board.is_capture(move):
+            continue
+        board.push(move)
+        score = -_quiescence(board, -beta, -alpha, depth + 1)
+        board.pop()
+        if score >= beta:
+            return beta
+        alpha = max(alpha, score)
+    return alpha
+
+def _negamax(board: chess.Board, depth: int, alpha: int, beta: int, ply: int) -> int:
+    if board.is_checkmate():
+        return -MATE_SCORE + ply
+    if board.is_stalemate() or board.is_insufficient_material():
+        return 0
+    if depth == 0:
+        return _quiescence(board, alpha, beta)
+    for move in _ordered_moves(board):
+        board.push(move)
+        score = -_negamax(board, depth - 1, -beta, -alpha, ply + 1)
+        board.pop()
+        if score >= beta:
+            return beta
+        alpha = max(alpha, score)
+    return alpha
+
+def search_best_move(board: chess.Board, depth: int = chess_search_depth):
+    """
+    Alpha-beta search on material with capture quiescence, finding short mates and tactics.
+    Returns the best move, or None when there is no legal move.
+    """
+    best_move, alpha = None, -MATE_SCORE - 1
+    for move in _ordered_moves(board):
+        board.push(move)
+        score = -_negamax(board, depth - 1, -MATE_SCORE - 1, -alpha, 1)
+        board.pop()
+        if score > alpha:
+            best_move, alpha = move, score
+    return best_move
 
 class ChessBestMoveTool(Tool):
     name = "ChessBestMoveTool"
@@ -34,23 +100,7 @@ class ChessBestMoveTool(Tool):
         if player:
             if (player.lower() == 'white' and not board.turn) or (player.lower() == 'black' and board.turn):
                 board.turn = not board.turn
-        # Try to get the best move (simple: highest material gain, fallback: first legal move)
-        best_move = None
-        best_score = -float('inf') if board.turn else float('inf')
-        for move in board.legal_moves:
-            board.push(move)
-            score = sum([piece.piece_type for piece in board.piece_map().values() if piece.color == board.turn])
-            board.pop()
-            if board.turn:
-                if score > best_score:
-                    best_score = score
-                    best_move = move
-            else:
-                if score < best_score:
-                    best_score = score
-                    best_move = move
-        if not best_move:
-            best_move = next(iter(board.legal_moves), None)
+        best_move = search_best_move(board)
         if not best_move:
             return "No legal moves available."
         return board.san(best_move)
@@ -84,21 +134,21 @@ system_prompt = (
     f"You are a specialized agent in chess problem solving."
     f"You must help answering the user's question by the next winning move in algebraic notation for the current board state."
     f"You should only base your answer on the information gathered from the chess board and relevent to the question"
-    f"You should rely on your ChessWinningMove tool to find the next winning move"
+    f"You should rely on your ChessBestMoveTool tool to find the next winning move"
     f"Before answering, you must control that the answer corresponds to the requested move, by running a few times to check the result"
     # f"If the answer is not the best move, try to find the best move."
     f"If the answer cannot be found or inferred from the chess board, respond with: 'EXCEPTION: The chess board does not allow answering the question.'"
 )
 
-chess_agent = CodeAgent(
-    model=general_model,
-    tools=[ChessWinningMove()],
-    add_base_tools=True,
-    # max_steps=10,
-    name="ChessAgent",
-    planning_interval=3,
-    additional_authorized_imports=["chess"],
-    description="This agent is responsible for helping with chess problem solving."
-)
-
-chess_agent.memory.system_prompt.system_prompt += f"\n{system_prompt}"
\ No newline at end of file
+def create_chess_agent():
+    chess_agent = CodeAgent(
+        model=general_model,
+        tools=[ChessBestMoveTool(), ChessWinningMove(), *base_tools()],
+        add_base_tools=False,
+        # max_steps=10,
+        name="ChessAgent",
+        planning_interval=3,
+        additional_authorized_imports=["chess"],
+        description="This agent is responsible for helping with chess problem solving."
+    )
+    return add_instructions(chess_agent, system_prompt)
\ No newline at end of file
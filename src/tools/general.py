@@ -1,4 +1,30 @@
 from smolagents import DuckDuckGoSearchTool, VisitWebpageTool
+from src.cassette import cassette
 
-search_tool = DuckDuckGoSearchTool()
-visit_tool = VisitWebpageTool()
\ No newline at end of file
+class CassetteSearchTool(DuckDuckGoSearchTool):
+    """DuckDuckGo search whose results are recorded and replayed by the cassette."""
+
+    def forward(self, query: str) -> str:
+        return cassette.through("search", {"query": query, "max_results": self.max_results}, lambda: super(CassetteSearchTool, self).forward(query))
+
+def base_tools() -> list:
+    """
+    The smolagents base tools (web search and webpage visit), with the search going through the cassette.
+    Agents take these with add_base_tools=False: add_base_tools=True adds a plain DuckDuckGoSearchTool
+    over any given `web_search`, and its HTTP client is not seen by the cassette's requests hook.
+
+    Every agent of a ManagerAgent gets the cassette search (no model call is made to build them):
+    >>> import contextlib, io, os, tempfile
+    >>> _ = os.environ.setdefault("OPENAI_API_KEY", "unused")
+    >>> from src.agent import ManagerAgent
+    >>> from src.memory_guard import iter_agents
+    >>> from src.tools.general import CassetteSearchTool
+    >>> with contextlib.redirect_stdout(io.StringIO()):
+    ...     manager = ManagerAgent(tempfile.mkdtemp())
+    >>> searching = [agent for agent in iter_agents(manager.agent) if "web_search" in agent.tools]
+    >>> sorted(agent.name for agent in searching)
+    ['ChessAgent', 'ManagerAgent', 'UnderstandWebPageAgent', 'VisionAgent', 'WebSearchAgent']
+    >>> all(type(agent.tools["web_search"]) is CassetteSearchTool for agent in searching)
+    True
+    """
+    return [CassetteSearchTool(), VisitWebpageTool()]
@@ -0,0 +1,57 @@
+import os
+import requests
+from urllib.parse import urlparse
+from pathlib import Path
+from smolagents import Tool
+from src.constants import default_scratch_dir
+from src.sandbox import sandbox_pool, format_sandbox_result
+
+class PythonSandboxTool(Tool):
+    name = "PythonSandboxTool"
+    description = (
+        "Runs a python file from the given url, or a python code snippet, in an isolated sandbox and returns what it prints. "
+        "Use it to find out what a python file outputs. The sandbox has no network access."
+    )
+    inputs = {
+        "file_url": {
+            "description": "URL to the python file to run.",
+            "type": "string",
+            "nullable": True
+        },
+        "code": {
+            "description": "Python code to run when no file url is given.",
+            "type": "string",
+            "nullable": True
+        }
+    }
+    output_type = "string"
+
+    def __init__(self, scratch_dir: str = default_scratch_dir):
+        super().__init__()
+        self.scratch_dir = scratch_dir
+        sandbox_pool.warm(background=True)
+
+    def forward(self, file_url: str = None, code: str = None) -> str:
+        try:
+            if file_url:
+                os.makedirs(self.scratch_dir, exist_ok=True)
+                file_name = os.path.basename(urlparse(file_url).path) or "python_file"
+                file_path = Path(os.path.join(self.scratch_dir, file_name if file_name.endswith(".py") else file_name + ".py"))
+                # Download file
+                try:
+                    response = requests.get(file_url, timeout=30)
+                    response.raise_for_status()
+                    with open(file_path, "wb") as f:
+                        f.write(response.content)
+                except Exception as download_err:
+                    print(f"Download failed: {download_err}. Trying fallback if file exists.")
+                    if not os.path.exists(file_path):
+                        return f"Error: Could not download or find fallback file. {download_err}"
+                result = sandbox_pool.run_file(file_path)
+            elif code:
+                result = sandbox_pool.run(code)
+            else:
+                return "Error: Provide either a file_url or some code to run."
+            return format_sandbox_result(result)
+        except Exception as e:
+            return f"Error: {str(e)}"
@@ -1,6 +1,7 @@
 from smolagents import CodeAgent, Tool
-from src.tools.general import visit_tool
+from src.tools.general import base_tools
 from src.models import general_model
+from src.prompts import add_instructions
 
 system_prompt = (
     f"You are a specialized agent. You must answer the user's question using ONLY the content of the given webpage."
@@ -10,7 +11,8 @@ system_prompt = (
 )
 
 def format_prompt_for_webpage_agent(url: str, question: str) -> str:
-    return f"{system_prompt}\nURL: {url}\nQuestion: {question}"
+    # The instructions are in the system prompt, the task only carries what changes between calls
+    return f"URL: {url}\nQuestion: {question}"
 
 class UnderstandWebPageTool(Tool):
     name = "UnderstandWebPageTool"
@@ -30,12 +32,13 @@ class UnderstandWebPageTool(Tool):
     def __init__(self):
         self.agent = CodeAgent(
             model=general_model,
-            tools=[visit_tool],
-            add_base_tools=True,
+            tools=base_tools(),
+            add_base_tools=False,
             # max_steps=6,
             name="UnderstandWebPageAgent",
             description="This agent is responsible for answering the user's question using ONLY the content of the given webpage. If the answer cannot be found or inferred from the webpage, the agent will respond with an exception saying that the webpage does not allow answering the question.",
         )
+        add_instructions(self.agent, system_prompt)
         self.is_initialized = True
         print("UnderstandWebPageTool initialized.")
 
@@ -51,6 +54,4 @@ class UnderstandWebPageTool(Tool):
             or "does not allow" in answer.lower()
         ):
             raise Exception("The webpage does not allow answering the question")
-        return str(answer)
-
-understand_webpage_tool = UnderstandWebPageTool()
\ No newline at end of file
+        return str(answer)
\ No newline at end of file
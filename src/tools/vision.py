@@ -1,11 +1,16 @@
 import os
 from smolagents import CodeAgent, Tool
 from src.models import general_model
+from src.prompts import add_instructions
 from urllib.parse import urlparse
 from pathlib import Path
 import requests
+import chess
 from PIL import Image
-from io import BytesIO
+from src.constants import image_fast_path, default_scratch_dir
+from src.image_analysis import board_to_fen, ocr_text
+from src.tools.chess import search_best_move
+from src.tools.general import base_tools
 
 system_prompt = (
     f"You are a specialized agent in interpreting images."
@@ -14,19 +19,19 @@ system_prompt = (
     # f"You should only return the information gathered from the image and relevent to the question"
 )
 
-vision_agent = CodeAgent(
-    model=general_model,
-    tools=[],
-    add_base_tools=True,
-    # max_steps=10,
-    name="VisionAgent",
-    description=(
-        f"This agent is responsible for understanding images and returning the content of the image that is relevant to the question."
-        f"Always return a string as a return value."
+def create_vision_agent():
+    vision_agent = CodeAgent(
+        model=general_model,
+        tools=base_tools(),
+        add_base_tools=False,
+        # max_steps=10,
+        name="VisionAgent",
+        description=(
+            f"This agent is responsible for understanding images and returning the content of the image that is relevant to the question."
+            f"Always return a string as a return value."
+        )
     )
-)
-
-vision_agent.memory.system_prompt.system_prompt += f"\n{system_prompt}"
+    return add_instructions(vision_agent, system_prompt)
 
 class VisionTool(Tool):
     name = "VisionTool"
@@ -47,16 +52,37 @@ class VisionTool(Tool):
     }
     output_type = "string"
     
-    def __init__(self):
-        self.agent = vision_agent
-
+    def __init__(self, scratch_dir: str = default_scratch_dir):
+        self.agent = create_vision_agent()
+        self.scratch_dir = scratch_dir
         self.is_initialized = True
     
+    def local_analysis(self, prompt: str, image: Image.Image):
+        """
+        Answers from the image without the vision model when it is a chess diagram
+        (recognized FEN fed to the chess search) or a text-heavy image (OCR).
+        Returns None when the image needs the vision model.
+        """
+        fen = board_to_fen(image, prompt)
+        if fen is not None:
+            board = chess.Board(fen)
+            best_move = search_best_move(board)
+            print(f"Chess diagram recognized locally: {fen}")
+            side = "White" if board.turn == chess.WHITE else "Black"
+            if best_move is None:
+                return f"Chess diagram recognized locally. FEN: {fen}\n{side} to move has no legal move."
+            return f"Chess diagram recognized locally. FEN: {fen}\nBest move for {side} found by the chess search: {board.san(best_move)}"
+        text = ocr_text(image)
+        if text is not None:
+            print(f"Image text read locally with OCR ({len(text)} characters).")
+            return f"Text of the image, read with OCR:\n{text}"
+        return None
+
     def forward(self, prompt: str, image_url: str, file_extension: str) -> str:
         try:
-            os.makedirs("./data", exist_ok=True)
+            os.makedirs(self.scratch_dir, exist_ok=True)
             file_name = os.path.basename(urlparse(image_url).path) or "image_file"
-            file_path = Path(os.path.join("./data", file_name + file_extension))
+            file_path = Path(os.path.join(self.scratch_dir, file_name + file_extension))
             # Download file
             try:
                 response = requests.get(image_url, timeout=30)
@@ -68,8 +94,15 @@ class VisionTool(Tool):
                 if not os.path.exists(file_path):
                     return f"Error: Could not download or find fallback file. {download_err}"
 
+            image = None
             try:
-                image = Image.open(BytesIO(response.content)).convert("RGB")
+                # Decoded from the saved file, so the downloaded body is not kept alive with the image
+                with Image.open(file_path) as source:
+                    image = source.convert("RGB")
+                if image_fast_path:
+                    analysis = self.local_analysis(prompt, image)
+                    if analysis is not None:
+                        return analysis
                 images = [image]
                 return self.agent.run(prompt, images=images)
             except Exception as pipeline_err:
@@ -77,6 +110,9 @@ class VisionTool(Tool):
                 if os.path.exists(file_path):
                     return self.agent.run(file_path)
                 return f"Error: Could not process audio. {pipeline_err}"
+            finally:
+                if image is not None:
+                    image.close()
         except Exception as e:
             return f"Error: {str(e)}"
         
\ No newline at end of file
@@ -1,8 +1,9 @@
 
 from smolagents import CodeAgent, Tool
-from src.tools.understand_web_page import understand_webpage_tool
-from src.tools.general import search_tool
+from src.tools.understand_web_page import UnderstandWebPageTool
+from src.tools.general import base_tools
 from src.models import general_model
+from src.prompts import add_instructions
 
 systemPrompt = (
     f"You are a specialized agent in retrieveing information from webpages."
@@ -15,16 +16,16 @@ systemPrompt = (
     f"If the answer is not coherent with the question, respond with: 'EXCEPTION: The answer is not coherent with the question.'"
 )
 
-web_rag_agent = CodeAgent(
-    model=general_model,
-    tools=[search_tool, understand_webpage_tool],
-    add_base_tools=True,
-    # max_steps=10,
-    name="WebSearchAgent",
-    description="This agent is responsible for answering the user's question by using search and visit tools to retrieve information from webpages."
-)
-
-web_rag_agent.memory.system_prompt.system_prompt += f"\n{systemPrompt}"
+def create_web_rag_agent():
+    web_rag_agent = CodeAgent(
+        model=general_model,
+        tools=[*base_tools(), UnderstandWebPageTool()],
+        add_base_tools=False,
+        # max_steps=10,
+        name="WebSearchAgent",
+        description="This agent is responsible for answering the user's question by using search and visit tools to retrieve information from webpages."
+    )
+    return add_instructions(web_rag_agent, systemPrompt)
 
 # class RAGTool(Tool):
 #     name = "RAGTool"